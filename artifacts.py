@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import joblib
+import prediction_cache
+import instrumentation
+
+# Versioned on-disk bundle for the TF-IDF + LogisticRegression pipeline.
+# A bundle is keyed by a fingerprint of the training data and the
+# hyperparameters, so a matching bundle can be loaded instead of refitting.
+BUNDLE_VERSION = 1
+ARTIFACT_DIR = "artifacts"
+TRAIN_PATH = "train.csv"
+TEST_PATH = "test.csv"
+# Winning configuration of the last sweep.py run; used instead of
+# DEFAULT_PARAMS when present
+SELECTED_NAME = "selected.json"
+
+DEFAULT_PARAMS = {
+    "vectorizer": {"max_df": 0.9},
+    "classifier": {"C": 0.1, "class_weight": "balanced"},
+}
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(params=None, train_path=TRAIN_PATH, test_path=TEST_PATH):
+    import sklearn
+
+    params = params or DEFAULT_PARAMS
+    payload = {
+        "bundle_version": BUNDLE_VERSION,
+        "sklearn": sklearn.__version__,
+        "train": file_digest(train_path),
+        "test": file_digest(test_path),
+        "params": params,
+    }
+    blob = json.dumps(payload, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def selected_path(artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, SELECTED_NAME)
+
+
+def resolve_params(params=None, artifact_dir=ARTIFACT_DIR):
+    # Explicit params, else the swept selection, else the defaults
+    if params:
+        return params
+    path = selected_path(artifact_dir)
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["params"]
+    return DEFAULT_PARAMS
+
+
+def vectorizer_params(params):
+    # JSON turns ngram_range into a list; TfidfVectorizer wants a tuple
+    options = dict(params["vectorizer"])
+    if "ngram_range" in options:
+        options["ngram_range"] = tuple(options["ngram_range"])
+    return options
+
+
+def bundle_path(key, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, f"tfidf-{key[:16]}.joblib")
+
+
+def manifest_path(key, artifact_dir=ARTIFACT_DIR):
+    return os.path.join(artifact_dir, f"tfidf-{key[:16]}.json")
+
+
+def build_bundle(params=None, train_path=TRAIN_PATH, test_path=TEST_PATH, artifact_dir=ARTIFACT_DIR):
+    import numpy as np
+    from sklearn.metrics import accuracy_score
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import LabelEncoder
+    from dataset_cache import prepare, train_classes
+
+    params = resolve_params(params, artifact_dir)
+    key = fingerprint(params, train_path, test_path)
+    start = time.perf_counter()
+
+    classes = train_classes(train_path)
+    train = prepare(train_path, classes)
+    test = prepare(test_path, classes)
+    train_messages = train.messages()
+
+    # Vectorize the text data
+    vectorizer = TfidfVectorizer(**vectorizer_params(params)).fit(train_messages)
+    X_train = vectorizer.transform(train_messages)
+    X_test = vectorizer.transform(test.messages())
+
+    # Encode the labels; the cached label codes already follow the sorted
+    # class order a fitted LabelEncoder uses
+    encoder = LabelEncoder().fit(classes)
+    y_train = np.asarray(train.labels, dtype=np.int64)
+    y_test = np.asarray(test.labels, dtype=np.int64)
+
+    # Train a logistic regression model
+    model = LogisticRegression(**params["classifier"])
+    model.fit(X_train, y_train)
+
+    metrics = {
+        "train_accuracy": float(accuracy_score(y_train, model.predict(X_train))),
+        "test_accuracy": float(accuracy_score(y_test, model.predict(X_test))),
+        "vocabulary_size": len(vectorizer.vocabulary_),
+        "fit_seconds": round(time.perf_counter() - start, 3),
+    }
+    print("Training Accuracy : ", metrics["train_accuracy"])
+    print("Testing Accuracy  : ", metrics["test_accuracy"])
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "key": key,
+        "params": params,
+        "train_path": train_path,
+        "test_path": test_path,
+        "classes": [str(c) for c in encoder.classes_],
+        "metrics": metrics,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    bundle = dict(manifest, vectorizer=vectorizer, model=model, encoder=encoder)
+
+    os.makedirs(artifact_dir, exist_ok=True)
+    # Write to a temporary name first so a crashed build never leaves a
+    # half-written bundle behind under a valid key.
+    tmp_path = bundle_path(key, artifact_dir) + ".tmp"
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, bundle_path(key, artifact_dir))
+    with open(manifest_path(key, artifact_dir), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return bundle
+
+
+def load_bundle(params=None, train_path=TRAIN_PATH, test_path=TEST_PATH, artifact_dir=ARTIFACT_DIR):
+    key = fingerprint(resolve_params(params, artifact_dir), train_path, test_path)
+    path = bundle_path(key, artifact_dir)
+    if not os.path.exists(path):
+        return None
+    bundle = joblib.load(path)
+    if bundle.get("version") != BUNDLE_VERSION or bundle.get("key") != key:
+        return None
+    return bundle
+
+
+def load_or_build(params=None, train_path=TRAIN_PATH, test_path=TEST_PATH, artifact_dir=ARTIFACT_DIR):
+    bundle = load_bundle(params, train_path, test_path, artifact_dir)
+    if bundle is None:
+        bundle = build_bundle(params, train_path, test_path, artifact_dir)
+    return bundle
+
+
+class TfidfClassifier:
+    # Serves a bundle with the same predict/predict_batch interface as
+    # model.SerenityModel. The bundle is loaded on first use.
+    namespace = "tfidf"
+
+    def __init__(self, params=None, artifact_dir=ARTIFACT_DIR, cache=prediction_cache.shared):
+        self.params = params
+        self.artifact_dir = artifact_dir
+        self.cache = cache
+        self.bundle = None
+
+    @property
+    def loaded(self):
+        return self.bundle is not None
+
+    @property
+    def version(self):
+        return self.load().bundle["key"]
+
+    def load(self):
+        if self.bundle is None:
+            self.bundle = load_or_build(self.params, artifact_dir=self.artifact_dir)
+            self.classes_ = self.bundle["encoder"].classes_
+        return self
+
+    def predict(self, message):
+        self.load()
+        if self.cache is None:
+            return self._predict_one(message)
+        return self.cache.get_or_compute(message, self.bundle["key"], lambda: self._predict_one(message),
+                                         namespace=self.namespace)
+
+    def _predict_one(self, message):
+        labels, probs, _ = self.predict_batch([message])
+        return labels[0], probs[0]
+
+    def predict_batch(self, messages, batch_size=None):
+        self.load()
+        messages = list(messages)
+        with instrumentation.trace(self.namespace, len(messages)) as trace:
+            with trace.stage("transform"):
+                features = self.bundle["vectorizer"].transform(messages)
+            trace.tokens(features.nnz)
+            with trace.stage("predict_proba"):
+                distribution = self.bundle["model"].predict_proba(features)
+            with trace.stage("decode"):
+                pred_idx = distribution.argmax(axis=1)
+                labels = self.classes_[pred_idx].tolist()
+                probs = distribution[range(len(pred_idx)), pred_idx].tolist()
+        return labels, probs, distribution
+
+
+def list_manifests(artifact_dir=ARTIFACT_DIR):
+    if not os.path.isdir(artifact_dir):
+        return []
+    manifests = []
+    for name in sorted(os.listdir(artifact_dir)):
+        if name.startswith("tfidf-") and name.endswith(".json"):
+            with open(os.path.join(artifact_dir, name)) as f:
+                manifests.append(json.load(f))
+    return manifests
+
+
+def invalidate(key=None, artifact_dir=ARTIFACT_DIR):
+    # Remove one bundle (by key prefix) or every bundle when key is None.
+    removed = []
+    for manifest in list_manifests(artifact_dir):
+        if key is not None and not manifest["key"].startswith(key):
+            continue
+        for path in (bundle_path(manifest["key"], artifact_dir), manifest_path(manifest["key"], artifact_dir)):
+            if os.path.exists(path):
+                os.remove(path)
+        removed.append(manifest["key"])
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage TF-IDF + LogisticRegression artifact bundles")
+    parser.add_argument("--dir", default=ARTIFACT_DIR, help="artifact directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="build the bundle for the current data and params")
+    build.add_argument("--force", action="store_true", help="rebuild even if a matching bundle exists")
+
+    sub.add_parser("info", help="show the current key and all stored bundles")
+
+    inv = sub.add_parser("invalidate", help="delete stored bundles")
+    inv.add_argument("key", nargs="?", help="key prefix to delete (default: all)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        start = time.perf_counter()
+        if args.force:
+            bundle = build_bundle(artifact_dir=args.dir)
+        else:
+            bundle = load_or_build(artifact_dir=args.dir)
+        print(f"Bundle {bundle['key'][:16]} ready in {time.perf_counter() - start:.3f}s")
+    elif args.command == "info":
+        current = fingerprint(resolve_params(artifact_dir=args.dir))
+        source = "selected.json" if os.path.exists(selected_path(args.dir)) else "defaults"
+        print(f"Current key: {current[:16]} (params from {source})")
+        for manifest in list_manifests(args.dir):
+            marker = "*" if manifest["key"] == current else " "
+            metrics = manifest["metrics"]
+            print(f"{marker} {manifest['key'][:16]}  created {manifest['created']}  "
+                  f"test acc {metrics['test_accuracy']:.4f}  params {json.dumps(manifest['params'], sort_keys=True)}")
+    elif args.command == "invalidate":
+        removed = invalidate(args.key, args.dir)
+        print(f"Removed {len(removed)} bundle(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+import torch
+from transformers import DistilBertForSequenceClassification
+import instrumentation
+
+# Interchangeable CPU inference backends for the DistilBERT classifier.
+# Every backend takes padded numpy input_ids/attention_mask and returns
+# numpy logits, so SerenityModel does not care which one it is using.
+BACKENDS = ("torch", "int8", "onnx")
+ONNX_NAME = "model.onnx"
+
+
+class TorchBackend:
+    name = "torch"
+
+    def __init__(self, model_dir, model=None):
+        self.model = model if model is not None else DistilBertForSequenceClassification.from_pretrained(model_dir)
+        self.model.eval()
+
+    def logits(self, input_ids, attention_mask):
+        with torch.inference_mode():
+            outputs = self.model(input_ids=torch.from_numpy(input_ids), attention_mask=torch.from_numpy(attention_mask))
+        return outputs.logits.numpy()
+
+
+class Int8Backend(TorchBackend):
+    name = "int8"
+
+    def __init__(self, model_dir, model=None):
+        super().__init__(model_dir, model)
+        # Dynamic quantization: Linear weights are stored as INT8 and
+        # activations are quantized on the fly, no calibration data needed.
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class OnnxBackend:
+    name = "onnx"
+
+    def __init__(self, model_dir, model=None):
+        import onnxruntime
+
+        path = os.path.join(model_dir, ONNX_NAME)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"'{path}' is missing (run: python backends.py export)")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.model = None
+
+    def logits(self, input_ids, attention_mask):
+        return self.session.run(["logits"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+
+def create_backend(name, model_dir, model=None):
+    backends = {"torch": TorchBackend, "int8": Int8Backend, "onnx": OnnxBackend}
+    if name not in backends:
+        raise ValueError(f"Unknown backend '{name}', expected one of {', '.join(BACKENDS)}")
+    return backends[name](model_dir, model)
+
+
+def export_onnx(model_dir, path=None, opset=14):
+    path = path or os.path.join(model_dir, ONNX_NAME)
+    model = DistilBertForSequenceClassification.from_pretrained(model_dir)
+    model.eval()
+    dummy = torch.ones((1, 8), dtype=torch.long)
+    torch.onnx.export(
+        model,
+        (dummy, dummy),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=opset,
+    )
+    return path
+
+
+def load_split(path):
+    from dataset_cache import load_texts
+
+    return load_texts(path)
+
+
+def measure(backend, splits, latency_samples=200):
+    # Runs inside a fresh interpreter per backend so peak RSS is not polluted
+    # by the other backends.
+    from model import SerenityModel
+
+    start = time.perf_counter()
+    model = SerenityModel(backend=backend, cache=None).load()
+    load_seconds = time.perf_counter() - start
+
+    result = {"backend": backend, "load_seconds": load_seconds, "splits": {}}
+    for path in splits:
+        messages, _ = load_split(path)
+        labels, _, _ = model.predict_batch(messages)
+        result["splits"][path] = labels
+
+    messages, _ = load_split(splits[0])
+    latencies = []
+    for message in messages[:latency_samples]:
+        start = time.perf_counter()
+        model.predict(message)
+        latencies.append((time.perf_counter() - start) * 1000)
+    result["p50_ms"] = float(np.percentile(latencies, 50))
+    result["p99_ms"] = float(np.percentile(latencies, 99))
+    result["peak_rss_mb"] = instrumentation.peak_rss_mb()
+    return result
+
+
+def parity_report(backends, splits, latency_samples=200):
+    runs = {}
+    for backend in backends:
+        output = subprocess.run(
+            [sys.executable, __file__, "measure", "--backend", backend,
+             "--samples", str(latency_samples), *splits],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        runs[backend] = json.loads(output.strip().splitlines()[-1])
+
+    reference = runs["torch"]
+    report = {"backends": {}}
+    for backend, run in runs.items():
+        entry = {
+            "load_seconds": run["load_seconds"],
+            "p50_ms": run["p50_ms"],
+            "p99_ms": run["p99_ms"],
+            "peak_rss_mb": run["peak_rss_mb"],
+            "splits": {},
+        }
+        for path in splits:
+            _, gold = load_split(path)
+            preds = run["splits"][path]
+            ref = reference["splits"][path]
+            per_label = {}
+            for label in sorted(set(ref)):
+                idx = [i for i, r in enumerate(ref) if r == label]
+                per_label[label] = sum(preds[i] == label for i in idx) / len(idx)
+            entry["splits"][path] = {
+                "accuracy": sum(p == g for p, g in zip(preds, gold)) / len(gold),
+                "agreement": sum(p == r for p, r in zip(preds, ref)) / len(ref),
+                "per_label_agreement": per_label,
+            }
+        report["backends"][backend] = entry
+    return report
+
+
+def print_report(report):
+    print(f"{'backend':<8} {'split':<10} {'acc':>7} {'agree':>7} {'p50 ms':>8} {'p99 ms':>8} {'rss MB':>8}")
+    for backend, entry in report["backends"].items():
+        rss = "n/a" if entry["peak_rss_mb"] is None else f"{entry['peak_rss_mb']:.1f}"
+        for path, split in entry["splits"].items():
+            print(f"{backend:<8} {path:<10} {split['accuracy']:>7.4f} {split['agreement']:>7.4f} "
+                  f"{entry['p50_ms']:>8.2f} {entry['p99_ms']:>8.2f} {rss:>8}")
+        worst = min(
+            ((label, agree) for split in entry["splits"].values() for label, agree in split["per_label_agreement"].items()),
+            key=lambda item: item[1],
+        )
+        print(f"{'':<8} lowest per-label agreement: {worst[0]} {worst[1]:.4f}")
+
+
+def main(argv=None):
+    from model import MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Export and compare CPU inference backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="export the saved model to ONNX")
+    export.add_argument("--model-dir", default=MODEL_DIR)
+    export.add_argument("--opset", type=int, default=14)
+
+    parity = sub.add_parser("parity", help="compare backends against the fp32 model")
+    parity.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parity.add_argument("--samples", type=int, default=200, help="messages used for latency percentiles")
+    parity.add_argument("--json", help="also write the report to this path")
+    parity.add_argument("splits", nargs="*", default=["test.csv", "val.csv"])
+
+    run = sub.add_parser("measure", help=argparse.SUPPRESS)
+    run.add_argument("--backend", required=True, choices=BACKENDS)
+    run.add_argument("--samples", type=int, default=200)
+    run.add_argument("splits", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        print("Exported", export_onnx(args.model_dir, opset=args.opset))
+    elif args.command == "parity":
+        backends = args.backends if "torch" in args.backends else ["torch"] + args.backends
+        report = parity_report(backends, args.splits, args.samples)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
+    elif args.command == "measure":
+        print(json.dumps(measure(args.backend, args.splits, args.samples)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
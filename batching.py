@@ -0,0 +1,220 @@
+import sys
+import time
+import asyncio
+import argparse
+import threading
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Deadline-aware micro-batching in front of any predict_batch(messages)
+# callable. Concurrent single-message requests are collected until the batch
+# is full, the oldest request has waited max_wait_ms, or waiting any longer
+# would miss the tightest caller deadline; the batch then runs as one forward
+# pass and every caller's future is resolved separately.
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Request:
+    __slots__ = ("message", "future", "enqueued", "deadline")
+
+    def __init__(self, message, deadline):
+        self.message = message
+        self.future = Future()
+        self.enqueued = time.monotonic()
+        self.deadline = deadline
+
+
+class BatchStats:
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.expired = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = collections.Counter()
+        self.wait_ms = collections.deque(maxlen=window)
+        self.service_ms = collections.deque(maxlen=window)
+
+    def record(self, batch_size, waits, service_ms):
+        with self.lock:
+            self.batches += 1
+            self.requests += batch_size
+            self.batch_sizes[batch_size] += 1
+            self.wait_ms.extend(waits)
+            self.service_ms.append(service_ms)
+
+    def snapshot(self, queue_depth):
+        with self.lock:
+            waits = sorted(self.wait_ms)
+            service = sorted(self.service_ms)
+            return {
+                "queue_depth": queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "batches": self.batches,
+                "requests": self.requests,
+                "expired": self.expired,
+                "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "wait_ms": percentiles(waits),
+                "service_ms": percentiles(service),
+            }
+
+
+def percentiles(values, points=(50, 95, 99)):
+    if not values:
+        return {f"p{p}": 0.0 for p in points}
+    return {f"p{p}": values[min(len(values) - 1, int(len(values) * p / 100))] for p in points}
+
+
+class MicroBatcher:
+    def __init__(self, predict_batch, max_batch_size=16, max_wait_ms=10.0, max_queue=1024):
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue = max_queue
+        self.pending = collections.deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.stats = BatchStats()
+        # Smoothed forward-pass time, used to start a batch early enough to
+        # meet caller deadlines
+        self.service_estimate = 0.0
+        self.thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, message, timeout=None):
+        # Returns a Future resolving to (label, probability, distribution row).
+        # timeout is the caller's latency budget in seconds.
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        request = Request(message, deadline)
+        with self.cond:
+            if self.closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if len(self.pending) >= self.max_queue:
+                raise QueueFull(f"{len(self.pending)} requests already queued")
+            self.pending.append(request)
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, len(self.pending))
+            self.cond.notify()
+        return request.future
+
+    def predict(self, message, timeout=None):
+        return self.submit(message, timeout).result()
+
+    async def predict_async(self, message, timeout=None):
+        return await asyncio.wrap_future(self.submit(message, timeout))
+
+    def queue_depth(self):
+        with self.cond:
+            return len(self.pending)
+
+    def snapshot(self):
+        return self.stats.snapshot(self.queue_depth())
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.thread.join()
+
+    def _dispatch_at(self):
+        dispatch_at = self.pending[0].enqueued + self.max_wait
+        deadlines = [r.deadline for r in self.pending if r.deadline is not None]
+        if deadlines:
+            dispatch_at = min(dispatch_at, min(deadlines) - self.service_estimate)
+        return dispatch_at
+
+    def _next_batch(self):
+        with self.cond:
+            while not self.pending and not self.closed:
+                self.cond.wait()
+            if not self.pending:
+                return None
+            while len(self.pending) < self.max_batch_size and not self.closed:
+                remaining = self._dispatch_at() - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.cond.wait(remaining)
+            count = min(self.max_batch_size, len(self.pending))
+            return [self.pending.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            now = time.monotonic()
+            live = []
+            for request in batch:
+                if request.deadline is not None and request.deadline <= now:
+                    request.future.set_exception(DeadlineExceeded("deadline passed while queued"))
+                    with self.stats.lock:
+                        self.stats.expired += 1
+                elif request.future.set_running_or_notify_cancel():
+                    live.append(request)
+            if not live:
+                continue
+
+            start = time.monotonic()
+            try:
+                labels, probs, distribution = self.predict_batch([r.message for r in live])
+            except Exception as e:
+                for request in live:
+                    request.future.set_exception(e)
+                continue
+            service = time.monotonic() - start
+            self.service_estimate = service if not self.service_estimate else 0.8 * self.service_estimate + 0.2 * service
+
+            for i, request in enumerate(live):
+                request.future.set_result((labels[i], probs[i], distribution[i]))
+            self.stats.record(len(live), [(start - r.enqueued) * 1000 for r in live], service * 1000)
+
+
+def benchmark(model, messages, concurrency, max_batch_size, max_wait_ms):
+    # Same concurrent load, once straight into model.predict and once through
+    # the batcher.
+    model.predict(messages[0])
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        list(pool.map(model.predict, messages))
+        direct = time.perf_counter() - start
+
+        batcher = MicroBatcher(model.predict_batch, max_batch_size, max_wait_ms)
+        start = time.perf_counter()
+        list(pool.map(batcher.predict, messages))
+        batched = time.perf_counter() - start
+        stats = batcher.snapshot()
+        batcher.close()
+    return direct, batched, stats
+
+
+def main(argv=None):
+    import json
+    from dataset_cache import load_texts
+    from model import SerenityModel, TEST_PATH
+
+    parser = argparse.ArgumentParser(description="Measure micro-batching in front of SerenityModel")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--backend", default="torch")
+    args = parser.parse_args(argv)
+
+    messages = load_texts(TEST_PATH)[0][:args.requests]
+    direct, batched, stats = benchmark(SerenityModel(backend=args.backend, cache=None), messages,
+                                       args.concurrency, args.max_batch_size, args.max_wait_ms)
+    print(f"direct : {len(messages) / direct:8.1f} req/s")
+    print(f"batched: {len(messages) / batched:8.1f} req/s ({direct / batched:.2f}x)")
+    print(json.dumps(stats, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import instrumentation
+
+# Reproducible comparison of the three classifiers this project ships:
+# the keyword rules from the chat window, the TF-IDF + LogisticRegression
+# bundle and the fine-tuned DistilBERT model. Each classifier is measured in
+# its own interpreter so cold start and peak RSS are not shared.
+CLASSIFIERS = ("keyword", "tfidf", "distilbert")
+SPLITS = ("test.csv", "val.csv")
+REPORT_PATH = "benchmark_report.json"
+BASELINE_PATH = "benchmark_baseline.json"
+
+# metric -> (direction, tolerance); a change worse than the tolerance in the
+# given direction is flagged as a regression
+THRESHOLDS = {
+    "accuracy": ("higher", 0.005),
+    "macro_f1": ("higher", 0.005),
+    "cold_start_s": ("lower", 0.25),
+    "p50_ms": ("lower", 0.15),
+    "p95_ms": ("lower", 0.15),
+    "p99_ms": ("lower", 0.25),
+    "batch_msgs_per_s": ("higher", 0.15),
+    "peak_rss_mb": ("lower", 0.10),
+}
+
+
+def create(name):
+    if name == "keyword":
+        from mood import KeywordClassifier
+        return KeywordClassifier()
+    if name == "tfidf":
+        from artifacts import TfidfClassifier
+        return TfidfClassifier(cache=None)
+    if name == "distilbert":
+        from model import SerenityModel
+        return SerenityModel(cache=None)
+    raise ValueError(f"Unknown classifier '{name}'")
+
+
+def macro_f1(gold, pred):
+    scores = []
+    for label in sorted(set(gold)):
+        tp = sum(g == label and p == label for g, p in zip(gold, pred))
+        fp = sum(g != label and p == label for g, p in zip(gold, pred))
+        fn = sum(g == label and p != label for g, p in zip(gold, pred))
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        scores.append(2 * precision * recall / (precision + recall) if precision + recall else 0.0)
+    return sum(scores) / len(scores)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def measure(name, splits, samples, batch_size):
+    # Reading (and on first use caching) the splits is timed on its own so
+    # it does not count as model cold start
+    start = time.perf_counter()
+    from dataset_cache import load_texts
+    data = {path: load_texts(path) for path in splits}
+    data_load = time.perf_counter() - start
+
+    # Cold start covers imports, artifact loading and the first prediction
+    start = time.perf_counter()
+    classifier = create(name).load()
+    classifier.predict(data[splits[0]][0][0])
+    cold_start = time.perf_counter() - start
+
+    result = {"data_load_s": data_load, "cold_start_s": cold_start, "splits": {}}
+    for path, (messages, gold) in data.items():
+        start = time.perf_counter()
+        labels, _, _ = classifier.predict_batch(messages, batch_size=batch_size)
+        seconds = time.perf_counter() - start
+        labels = [str(label) for label in labels]
+        result["splits"][path] = {
+            "accuracy": sum(p == g for p, g in zip(labels, gold)) / len(gold),
+            "macro_f1": macro_f1(gold, labels),
+            "batch_msgs_per_s": len(messages) / seconds,
+        }
+
+    latencies = []
+    for message in data[splits[0]][0][:samples]:
+        start = time.perf_counter()
+        classifier.predict(message)
+        latencies.append((time.perf_counter() - start) * 1000)
+    for p in (50, 95, 99):
+        result[f"p{p}_ms"] = percentile(latencies, p)
+    result["peak_rss_mb"] = instrumentation.peak_rss_mb()
+    return result
+
+
+def run(classifiers, splits, samples, batch_size):
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "samples": samples,
+        "batch_size": batch_size,
+        "classifiers": {},
+    }
+    for name in classifiers:
+        completed = subprocess.run(
+            [sys.executable, __file__, "measure", name, "--samples", str(samples),
+             "--batch-size", str(batch_size), *splits],
+            capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            report["classifiers"][name] = {"error": completed.stderr.strip().splitlines()[-1:]}
+            continue
+        report["classifiers"][name] = json.loads(completed.stdout.strip().splitlines()[-1])
+    return report
+
+
+def flatten(entry):
+    # Metrics of one classifier as {"metric" or "split/metric": value}
+    flat = {k: v for k, v in entry.items() if isinstance(v, (int, float))}
+    for path, metrics in entry.get("splits", {}).items():
+        for k, v in metrics.items():
+            flat[f"{path}/{k}"] = v
+    return flat
+
+
+def diff(report, baseline):
+    rows = []
+    for name, entry in report["classifiers"].items():
+        base = baseline.get("classifiers", {}).get(name)
+        if not base or "error" in entry or "error" in base:
+            continue
+        current, previous = flatten(entry), flatten(base)
+        for metric, value in current.items():
+            # data_load_s depends on the dataset cache state and is not gated
+            if metric not in previous or metric.split("/")[-1] not in THRESHOLDS:
+                continue
+            old = previous[metric]
+            direction, tolerance = THRESHOLDS[metric.split("/")[-1]]
+            if metric.split("/")[-1] in ("accuracy", "macro_f1"):
+                change = value - old
+                worse = -change if direction == "higher" else change
+            else:
+                change = (value - old) / old if old else 0.0
+                worse = -change if direction == "higher" else change
+            rows.append({
+                "classifier": name,
+                "metric": metric,
+                "baseline": old,
+                "current": value,
+                "change": change,
+                "regression": worse > tolerance,
+            })
+    return rows
+
+
+def print_report(report):
+    print(f"{'classifier':<11} {'split':<9} {'acc':>7} {'macroF1':>8} {'batch/s':>9} "
+          f"{'cold s':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'rss MB':>7}")
+    for name, entry in report["classifiers"].items():
+        if "error" in entry:
+            print(f"{name:<11} failed: {' '.join(entry['error'])}")
+            continue
+        rss = "n/a" if entry["peak_rss_mb"] is None else f"{entry['peak_rss_mb']:.0f}"
+        for path, split in entry["splits"].items():
+            print(f"{name:<11} {path:<9} {split['accuracy']:>7.4f} {split['macro_f1']:>8.4f} "
+                  f"{split['batch_msgs_per_s']:>9.0f} {entry['cold_start_s']:>7.2f} {entry['p50_ms']:>8.3f} "
+                  f"{entry['p95_ms']:>8.3f} {entry['p99_ms']:>8.3f} {rss:>7}")
+
+
+def print_diff(rows):
+    for row in rows:
+        marker = "REGRESSION" if row["regression"] else ""
+        if row["metric"].split("/")[-1] in ("accuracy", "macro_f1"):
+            change = f"{row['change']:+.4f}"
+        else:
+            change = f"{row['change']:+.1%}"
+        print(f"{row['classifier']:<11} {row['metric']:<28} {row['baseline']:>10.4f} -> {row['current']:>10.4f} "
+              f"{change:>8} {marker}")
+
+
+def chart_open_time(points, repeats=3):
+    # Time to construct and first-draw MoodChartDialog for a synthetic
+    # history of the given size, without a display
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import numpy as np
+    from PyQt5.QtWidgets import QApplication
+    from chatbot import MoodChartDialog
+
+    app = QApplication.instance() or QApplication([])
+    rng = np.random.default_rng(0)
+    now = time.time()
+    times = now - np.arange(points)[::-1] * 600.0
+    scores = np.clip(np.round(5 + np.cumsum(rng.normal(0, 0.3, points))), 1, 10)
+    series = list(zip(times.tolist(), scores.tolist()))
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        dialog = MoodChartDialog(series)
+        app.processEvents()
+        timings.append(time.perf_counter() - start)
+        dialog.deleteLater()
+    return min(timings)
+
+
+def transcript_append_time(counts, samples=200):
+    # Mean time of one append to the chat transcript after it already holds
+    # each number of messages, without a display
+    import tempfile
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from history_store import TranscriptStore
+    from transcript import TranscriptView
+
+    app = QApplication.instance() or QApplication([])
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        view = TranscriptView(TranscriptStore(os.path.join(tmp, "transcript.db")))
+        view.resize(800, 600)
+        view.show()
+        sent = 0
+        for count in sorted(counts):
+            while sent < count:
+                view.append(f"<b>You:</b> message {sent}", is_user=sent % 2 == 0)
+                sent += 1
+                if sent % 1000 == 0:
+                    app.processEvents()
+            app.processEvents()
+            start = time.perf_counter()
+            for _ in range(samples):
+                view.append(f"<b>🤖 SerenityAI:</b> reply {sent}")
+                app.processEvents()
+                sent += 1
+            results[count] = (time.perf_counter() - start) / samples
+        view.close_store()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the keyword, TF-IDF/LR and DistilBERT classifiers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    bench = sub.add_parser("run", help="run the benchmark and write a JSON report")
+    bench.add_argument("--classifiers", nargs="+", default=list(CLASSIFIERS), choices=CLASSIFIERS)
+    bench.add_argument("--samples", type=int, default=500, help="messages used for latency percentiles")
+    bench.add_argument("--batch-size", type=int, default=64)
+    bench.add_argument("--output", default=REPORT_PATH)
+    bench.add_argument("--baseline", default=BASELINE_PATH, help="report to diff against, if it exists")
+    bench.add_argument("--save-baseline", action="store_true", help="also store this run as the baseline")
+    bench.add_argument("splits", nargs="*", default=list(SPLITS))
+
+    chart = sub.add_parser("chart", help="time opening the mood chart for large histories")
+    chart.add_argument("--points", type=int, nargs="+", default=[100, 10000, 100000])
+
+    chat = sub.add_parser("transcript", help="time chat transcript appends as the session grows")
+    chat.add_argument("--messages", type=int, nargs="+", default=[10, 1000, 10000, 100000])
+
+    one = sub.add_parser("measure", help=argparse.SUPPRESS)
+    one.add_argument("name", choices=CLASSIFIERS)
+    one.add_argument("--samples", type=int, default=500)
+    one.add_argument("--batch-size", type=int, default=64)
+    one.add_argument("splits", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "measure":
+        print(json.dumps(measure(args.name, args.splits, args.samples, args.batch_size)))
+        return 0
+    if args.command == "chart":
+        for points in args.points:
+            print(f"{points:>8} points: mood chart opens in {chart_open_time(points) * 1000:.1f} ms")
+        return 0
+    if args.command == "transcript":
+        for count, seconds in transcript_append_time(args.messages).items():
+            print(f"{count:>8} messages: append takes {seconds * 1000:.2f} ms")
+        return 0
+
+    report = run(args.classifiers, args.splits, args.samples, args.batch_size)
+    print_report(report)
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            rows = diff(report, json.load(f))
+        report["diff"] = rows
+        print()
+        print_diff(rows)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({k: v for k, v in report.items() if k != "diff"}, f, indent=2)
+    regressions = [row for row in report.get("diff", []) if row["regression"]]
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import argparse
+import prediction_cache
+import artifacts
+from artifacts import TfidfClassifier
+
+# Confidence-gated cascade: the TF-IDF/LR model answers when its top
+# probability clears the threshold and only the remaining, uncertain messages
+# are escalated to the DistilBERT SerenityModel. The threshold comes from
+# artifacts/cascade.json, written by the calibration sweep on val.csv.
+CALIBRATION_PATH = os.path.join(artifacts.ARTIFACT_DIR, "cascade.json")
+DEFAULT_THRESHOLD = 0.6
+VAL_PATH = "val.csv"
+
+
+def calibrated_threshold(path=CALIBRATION_PATH):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)["threshold"]
+    return DEFAULT_THRESHOLD
+
+
+class CascadeClassifier:
+    def __init__(self, fast=None, slow=None, threshold=None, cache=prediction_cache.shared):
+        if slow is None:
+            from model import SerenityModel
+            slow = SerenityModel(cache=None)
+        self.fast = fast or TfidfClassifier(cache=None)
+        self.slow = slow
+        self.threshold = threshold if threshold is not None else calibrated_threshold()
+        self.cache = cache
+        self.fast_version = None
+        # Filled in by the first escalation, so the fast path works even
+        # when the transformer is not on disk
+        self.slow_version = None
+        self.requests = 0
+        self.escalations = 0
+
+    @property
+    def loaded(self):
+        return self.fast_version is not None
+
+    @property
+    def version(self):
+        # Cached predictions made before the first escalation only depend on
+        # the fast model; the key changes once the slow model is involved
+        slow = self.slow_version[:16] if self.slow_version else "-"
+        return f"{self.load().fast_version[:16]}|{slow}|{self.threshold}"
+
+    def load(self):
+        # The transformer is only loaded by the first escalation
+        if self.fast_version is None:
+            self.fast.load()
+            self.classes_ = self.fast.classes_
+            self.fast_version = self.fast.version
+        return self
+
+    @property
+    def escalation_rate(self):
+        return self.escalations / self.requests if self.requests else 0.0
+
+    def predict(self, message):
+        self.load()
+        if self.cache is None:
+            return self._predict_one(message)
+        return self.cache.get_or_compute(message, self.version, lambda: self._predict_one(message),
+                                         namespace="cascade")
+
+    def _predict_one(self, message):
+        labels, probs, _ = self.predict_batch([message])
+        return labels[0], probs[0]
+
+    def predict_batch(self, messages, batch_size=32):
+        import numpy as np
+
+        self.load()
+        messages = list(messages)
+        labels, probs, distribution = self.fast.predict_batch(messages)
+        distribution = np.array(distribution, dtype=np.float64)
+        uncertain = [i for i, p in enumerate(probs) if p < self.threshold]
+        if uncertain and self.slow_version is None:
+            self.slow_version = self.slow.artifact_version()
+        self.requests += len(messages)
+        self.escalations += len(uncertain)
+        if uncertain:
+            slow_labels, slow_probs, slow_dist = self.slow.predict_batch([messages[i] for i in uncertain], batch_size)
+            # Both models use sorted class names; align columns by name anyway
+            columns = [list(self.slow.classes_).index(c) for c in self.classes_]
+            for row, i in enumerate(uncertain):
+                labels[i], probs[i] = slow_labels[row], slow_probs[row]
+                distribution[i] = slow_dist[row][columns]
+        return labels, probs, distribution
+
+
+def mean_latency_ms(classifier, messages):
+    classifier.predict(messages[0])
+    start = time.perf_counter()
+    for message in messages:
+        classifier.predict(message)
+    return (time.perf_counter() - start) * 1000 / len(messages)
+
+
+def calibrate(fast, slow, val_path=VAL_PATH, thresholds=None, samples=200):
+    # Both models score val.csv once; every threshold is then evaluated from
+    # those predictions. Expected latency assumes each message pays for the
+    # fast model and escalated ones also pay for the transformer.
+    from dataset_cache import load_texts
+
+    messages, gold = load_texts(val_path)
+    fast_labels, fast_probs, _ = fast.load().predict_batch(messages)
+    slow_labels, _, _ = slow.load().predict_batch(messages)
+    fast_ms = mean_latency_ms(fast, messages[:samples])
+    slow_ms = mean_latency_ms(slow, messages[:samples])
+
+    fast_correct = [str(p) == g for p, g in zip(fast_labels, gold)]
+    slow_correct = [str(p) == g for p, g in zip(slow_labels, gold)]
+    thresholds = thresholds or [round(0.3 + 0.05 * i, 2) for i in range(14)]
+    rows = []
+    for threshold in thresholds:
+        escalated = [p < threshold for p in fast_probs]
+        correct = sum(s if e else f for f, s, e in zip(fast_correct, slow_correct, escalated))
+        rate = sum(escalated) / len(messages)
+        rows.append({
+            "threshold": threshold,
+            "escalation_rate": rate,
+            "accuracy": correct / len(messages),
+            "expected_ms": fast_ms + rate * slow_ms,
+        })
+    return {
+        "val_path": val_path,
+        "fast_accuracy": sum(fast_correct) / len(messages),
+        "slow_accuracy": sum(slow_correct) / len(messages),
+        "fast_ms": fast_ms,
+        "slow_ms": slow_ms,
+        "rows": rows,
+    }
+
+
+def choose(report, tolerance):
+    # Cheapest threshold whose accuracy is within tolerance of the
+    # transformer alone, else the most accurate one
+    good = [r for r in report["rows"] if r["accuracy"] >= report["slow_accuracy"] - tolerance]
+    if good:
+        return min(good, key=lambda r: r["expected_ms"])
+    return max(report["rows"], key=lambda r: r["accuracy"])
+
+
+def print_report(report, chosen=None):
+    print(f"tfidf alone: acc {report['fast_accuracy']:.4f}, {report['fast_ms']:.3f} ms/msg")
+    print(f"distilbert alone: acc {report['slow_accuracy']:.4f}, {report['slow_ms']:.3f} ms/msg")
+    print(f"{'threshold':>9} {'escalated':>9} {'acc':>7} {'expected ms':>11}")
+    for row in report["rows"]:
+        marker = " <" if chosen is row else ""
+        print(f"{row['threshold']:>9.2f} {row['escalation_rate']:>9.1%} {row['accuracy']:>7.4f} "
+              f"{row['expected_ms']:>11.3f}{marker}")
+
+
+def main(argv=None):
+    from model import SerenityModel
+
+    parser = argparse.ArgumentParser(description="TF-IDF/LR -> DistilBERT cascade")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    cal = sub.add_parser("calibrate", help="sweep the escalation threshold on val.csv")
+    cal.add_argument("--thresholds", type=float, nargs="+")
+    cal.add_argument("--tolerance", type=float, default=0.005,
+                     help="accuracy below DistilBERT alone that is acceptable")
+    cal.add_argument("--samples", type=int, default=200, help="messages used to time each model")
+    cal.add_argument("--backend", default="torch")
+    cal.add_argument("--dry-run", action="store_true", help="do not write artifacts/cascade.json")
+
+    pred = sub.add_parser("predict", help="classify messages through the cascade")
+    pred.add_argument("messages", nargs="+")
+    pred.add_argument("--threshold", type=float)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "predict":
+        cascade = CascadeClassifier(threshold=args.threshold, cache=None)
+        labels, probs, _ = cascade.predict_batch(args.messages)
+        for message, label, prob in zip(args.messages, labels, probs):
+            print(f"{label:<10} {prob:.3f}  {message}")
+        print(f"escalated {cascade.escalations}/{cascade.requests} at threshold {cascade.threshold}")
+        return 0
+
+    report = calibrate(TfidfClassifier(cache=None), SerenityModel(backend=args.backend, cache=None),
+                       thresholds=args.thresholds, samples=args.samples)
+    chosen = choose(report, args.tolerance)
+    print_report(report, chosen)
+    if not args.dry_run:
+        os.makedirs(os.path.dirname(CALIBRATION_PATH), exist_ok=True)
+        with open(CALIBRATION_PATH, "w") as f:
+            json.dump(dict(chosen, tolerance=args.tolerance, backend=args.backend,
+                           created=time.strftime("%Y-%m-%dT%H:%M:%S"), report=report), f, indent=2)
+        print(f"threshold {chosen['threshold']} written to {CALIBRATION_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
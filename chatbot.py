@@ -1,16 +1,20 @@
 import sys
 import time
-import random
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+IMPORT_START = time.perf_counter()
+import queue
+import argparse
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                            QTextEdit, QLineEdit, QPushButton, QLabel, QFrame, QStatusBar,
+                            QLineEdit, QPushButton, QLabel, QFrame, QStatusBar,
                             QDialog, QRadioButton, QButtonGroup, QMessageBox)
-from PyQt5.QtGui import QTextCursor, QFont, QColor, QPalette, QIcon
-from PyQt5.QtCore import Qt, QSize
-import speech_recognition as sr
+from PyQt5.QtGui import QFont, QColor, QPalette, QIcon
+from PyQt5.QtCore import Qt, QSize, QThread, QTimer, pyqtSignal
 from datetime import datetime
-import numpy as np
+import phq9
+from mood import KeywordClassifier, score_mood, select_response
+from intent_engine import IntentMatcher, load_intents
+from conversation import ConversationEngine, Session
+from history_store import MoodStore
+from transcript import TranscriptView
 
 class QuizDialog(QDialog):
     def __init__(self, parent=None):
@@ -30,24 +34,8 @@ class QuizDialog(QDialog):
             }
         """)
         
-        self.questions = [
-            "Little interest or pleasure in doing things?",
-            "Feeling down, depressed, or hopeless?",
-            "Trouble falling or staying asleep, or sleeping too much?",
-            "Feeling tired or having little energy?",
-            "Poor appetite or overeating?",
-            "Feeling bad about yourself or that you're a failure?",
-            "Trouble concentrating on things?",
-            "Moving or speaking slowly, or being fidgety?",
-            "Thoughts that you would be better off dead?"
-        ]
-        
-        self.responses = {
-            "Not at all": 0,
-            "Several days": 1,
-            "More than half the days": 2,
-            "Nearly every day": 3
-        }
+        self.questions = phq9.QUESTIONS
+        self.responses = phq9.OPTIONS
         
         self.current_question = 0
         self.scores = []
@@ -192,13 +180,19 @@ class MoodChartDialog(QDialog):
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
         
-        # Create figure with dark theme
-        plt.style.use('dark_background')
-        self.figure = plt.figure(facecolor='#1E3A4D')
+        # matplotlib is only imported once a chart is opened. A bare Figure
+        # is not tracked by pyplot, so closing the dialog frees it
+        import matplotlib.style
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+
+        matplotlib.style.use('dark_background')
+        self.figure = Figure(facecolor='#1E3A4D')
         self.canvas = FigureCanvas(self.figure)
         self.layout.addWidget(self.canvas)
         
         # Plot data
+        self.line = None
         self.plot_mood_data(mood_data)
         
         # Close button
@@ -222,36 +216,138 @@ class MoodChartDialog(QDialog):
         self.layout.addWidget(self.close_button, 0, Qt.AlignCenter)
 
     def plot_mood_data(self, mood_data):
-        ax = self.figure.add_subplot(111)
-        
-        # Sample data (replace with actual mood data)
-        dates = [datetime.now().replace(hour=0, minute=0, second=0) for _ in range(15)]
-        scores = [random.randint(1, 10) for _ in range(15)]
-        
-        ax.plot(dates, scores, marker='o', color='#4A90E2', linewidth=2, markersize=8)
-        ax.set_title("Your Mood Over Time", color='#E0ECE4', pad=20)
-        ax.set_xlabel("Date", color='#7F9FB5')
-        ax.set_ylabel("Mood Score (1-10)", color='#7F9FB5')
-        
-        # Customize appearance
-        ax.set_facecolor('#1E3A4D')
-        self.figure.patch.set_facecolor('#1E3A4D')
-        ax.tick_params(colors='#7F9FB5')
-        ax.grid(color='#2A527A', linestyle='--', alpha=0.5)
-        
-        for spine in ax.spines.values():
-            spine.set_color('#7F9FB5')
+        # mood_data is a list of entry dicts or (epoch seconds, score) pairs.
+        # The line artist is created once; later calls and add_entry only
+        # swap its data.
+        self.times, self.scores = self.to_arrays(mood_data)
+        if self.line is None:
+            ax = self.figure.add_subplot(111)
+            self.ax = ax
+            self.line, = ax.plot([], [], color='#4A90E2', linewidth=2, markersize=8)
+            ax.set_title("Your Mood Over Time", color='#E0ECE4', pad=20)
+            ax.set_xlabel("Date", color='#7F9FB5')
+            ax.set_ylabel("Mood Score (1-10)", color='#7F9FB5')
+            ax.set_ylim(0, 10.5)
+            ax.xaxis_date()
+            
+            # Customize appearance
+            ax.set_facecolor('#1E3A4D')
+            self.figure.patch.set_facecolor('#1E3A4D')
+            ax.tick_params(colors='#7F9FB5')
+            ax.grid(color='#2A527A', linestyle='--', alpha=0.5)
+            
+            for spine in ax.spines.values():
+                spine.set_color('#7F9FB5')
         
+        self.update_line()
         self.canvas.draw()
 
+    @staticmethod
+    def to_arrays(mood_data):
+        import numpy as np
+
+        if mood_data and isinstance(mood_data[0], dict):
+            pairs = [(entry["timestamp"].timestamp(), entry["score"]) for entry in mood_data]
+        else:
+            pairs = mood_data
+        data = np.asarray(pairs, dtype=np.float64).reshape(-1, 2)
+        return data[:, 0], data[:, 1]
+
+    def max_points(self):
+        # About two points per horizontal pixel is all the canvas can show
+        return max(200, 2 * self.canvas.width())
+
+    def update_line(self):
+        import matplotlib.dates as mdates
+        import downsample
+
+        times, scores = downsample.lttb(self.times, self.scores, self.max_points())
+        # Only the kept points are converted to local-time date numbers
+        dates = mdates.date2num([datetime.fromtimestamp(t) for t in times])
+        self.line.set_data(dates, scores)
+        self.line.set_marker('o' if len(times) <= 100 else '')
+        if len(dates):
+            pad = max((dates[-1] - dates[0]) * 0.02, 1 / 24)
+            self.ax.set_xlim(dates[0] - pad, dates[-1] + pad)
+
+    def add_entry(self, entry):
+        # Incremental update while the dialog is open
+        import numpy as np
+
+        self.times = np.append(self.times, entry["timestamp"].timestamp())
+        self.scores = np.append(self.scores, entry["score"])
+        self.update_line()
+        self.canvas.draw_idle()
+
+class ResponseWorker(QThread):
+    # Steps the conversation and scores moods off the GUI thread. Messages
+    # arrive through a queue and the bot lines are posted back with
+    # response_ready, which Qt delivers to the GUI thread as a queued signal.
+    response_ready = pyqtSignal(int, object, object)
+
+    def __init__(self, engine, session, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.session = session
+        self.requests = queue.Queue()
+
+    def submit(self, request_id, message):
+        self.requests.put((request_id, message))
+
+    def stop(self):
+        self.requests.put(None)
+        self.wait()
+
+    def run(self):
+        while True:
+            item = self.requests.get()
+            if item is None:
+                return
+            request_id, message = item
+            mood = None
+            # Only feeling and small-talk messages are moods; names, quiz
+            # answers and confirmations would pile up neutral scores
+            if self.engine.expects_mood(self.session):
+                mood = {
+                    "timestamp": datetime.now(),
+                    "message": message,
+                    "score": score_mood(message)
+                }
+            turn = self.engine.step(self.session, message)
+            self.response_ready.emit(request_id, turn.lines, mood)
+
+class VoiceCaptureThread(QThread):
+    # Runs a voice.VoiceCapture pipeline; partial transcripts are emitted as
+    # each detected utterance is recognized.
+    partial = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, capture, parent=None):
+        super().__init__(parent)
+        self.capture = capture
+
+    def cancel(self):
+        self.capture.cancel()
+
+    def run(self):
+        try:
+            self.capture.run(on_partial=self.partial.emit)
+        except Exception as e:
+            self.failed.emit(str(e))
+
 class SerenityChatbot(QMainWindow):
+    # Minimum time the typing indicator is shown before a response appears
+    TYPING_DELAY_MS = 1500
+    TRANSCRIPT_WINDOW = 500
+
     def __init__(self):
         super().__init__()
         
-        self.name = None
         self.dark_mode = True
-        self.mood_history = []
-        self.recognizer = sr.Recognizer()
+        self.mood_store = None
+        self.mood_dialog = None
+        self.recognizer_name = "google"  # or "sphinx" for offline recognition
+        self.voice_thread = None
         self.is_listening = False
         
         self.responses = {
@@ -286,10 +382,29 @@ class SerenityChatbot(QMainWindow):
             ]
         }
         
+        self.next_request_id = 0
+        self.pending = {}
+        # The conversation engine drives the dialog (name, feeling, quiz
+        # offer); once it is done, replies come from the responses above.
+        # Messages sent before load_models runs wait in the worker's queue.
+        intents, intent_responses = load_intents()
+        self.engine = ConversationEngine(KeywordClassifier(), IntentMatcher(intents), intent_responses,
+                                         small_talk=lambda message: select_response(self.responses, message))
+        self.session = Session()
+        self.worker = ResponseWorker(self.engine, self.session, self)
+        self.worker.response_ready.connect(self.on_response_ready)
+        
         self.setup_ui()
         self.show_welcome_message()
         self.apply_theme()
 
+    def load_models(self):
+        # Called once the window is on screen so the first paint does not
+        # wait on the mood database or the response worker
+        if self.mood_store is None:
+            self.mood_store = MoodStore()
+            self.worker.start()
+
     def setup_ui(self):
         self.setWindowTitle("SerenityAI - Mental Health Companion")
         self.setGeometry(100, 100, 850, 650)
@@ -302,20 +417,17 @@ class SerenityChatbot(QMainWindow):
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout.setSpacing(0)
         
-        # Chat area
-        self.chat_area = QTextEdit()
-        self.chat_area.setReadOnly(True)
-        self.chat_area.setFrameShape(QFrame.NoFrame)
-        self.chat_area.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        # Chat area: a virtualized transcript that keeps only a window of
+        # messages in memory and pages older ones through TranscriptStore
+        self.chat_area = TranscriptView(window=self.TRANSCRIPT_WINDOW)
         self.chat_area.setStyleSheet("""
-            QTextEdit {
+            QListView {
                 background-color: #0F1C26;
                 color: #E0ECE4;
                 font-family: 'Helvetica Neue', Arial;
                 font-size: 14px;
                 padding: 20px;
                 border: none;
-                line-height: 1.5;
             }
             QScrollBar:vertical {
                 border: none;
@@ -485,45 +597,14 @@ class SerenityChatbot(QMainWindow):
 
     def show_welcome_message(self):
         welcome_msg = """
-        <div style='margin-bottom: 20px;'>
-            <div style='background-color: #1E3A4D; color: #E0ECE4; border-radius: 10px; 
-                        padding: 15px; display: inline-block; max-width: 80%; 
-                        line-height: 1.5;'>
-                <b>🤖 SerenityAI:</b> Welcome to your mental health companion.<br><br>
-                I'm here to provide a safe space where you can express your feelings.<br><br>
-                To begin, may I know your name?
-            </div>
-        </div>
+        <b>🤖 SerenityAI:</b> Welcome to your mental health companion.<br><br>
+        I'm here to provide a safe space where you can express your feelings.<br><br>
+        To begin, may I know your name?
         """
         self.append_to_chat(welcome_msg)
 
     def append_to_chat(self, html, is_user=False):
-        cursor = self.chat_area.textCursor()
-        cursor.movePosition(QTextCursor.End)
-        
-        if is_user:
-            html = f"""
-            <div style='margin-bottom: 15px; text-align: right;'>
-                <div style='background-color: #2A527A; color: white; border-radius: 10px; 
-                            padding: 12px 15px; display: inline-block; max-width: 80%; 
-                            line-height: 1.5;'>
-                    {html}
-                </div>
-            </div>
-            """
-        else:
-            html = f"""
-            <div style='margin-bottom: 15px;'>
-                <div style='background-color: #1E3A4D; color: #E0ECE4; border-radius: 10px; 
-                            padding: 12px 15px; display: inline-block; max-width: 80%; 
-                            line-height: 1.5;'>
-                    {html}
-                </div>
-            </div>
-            """
-        
-        cursor.insertHtml(html)
-        self.chat_area.ensureCursorVisible()
+        self.chat_area.append(html.strip(), is_user)
 
     def send_message(self):
         message = self.input_field.text().strip()
@@ -535,68 +616,41 @@ class SerenityChatbot(QMainWindow):
         self.process_user_message(message)
 
     def process_user_message(self, message):
-        # First message is name
-        if not self.name:
-            self.name = message
-            response = f"""
-            <b>🤖 SerenityAI:</b> Thank you, {self.name}.<br><br>
-            How are you feeling today? I'm here to listen.
-            """
-            self.append_to_chat(response)
-            return
-        
-        # Record mood
-        self.record_mood(message)
-        
-        # Generate response
-        if "sad" in message.lower() or "depressed" in message.lower():
-            response = random.choice(self.responses["sad"])
-        elif "happy" in message.lower() or "good" in message.lower():
-            response = random.choice(self.responses["happy"])
-        else:
-            response = random.choice(self.responses["default"])
-        
-        # Simulate typing delay
+        # Step the conversation and score the mood on the worker thread
+        request_id = self.next_request_id
+        self.next_request_id += 1
+        self.pending[request_id] = time.monotonic()
         self.status_bar.showMessage("SerenityAI is typing...")
-        QApplication.processEvents()
-        time.sleep(1.5)
-        
+        self.worker.submit(request_id, message)
+
+    def on_response_ready(self, request_id, lines, mood):
+        # Keep the typing indicator up for at least TYPING_DELAY_MS without
+        # blocking the event loop.
+        elapsed_ms = (time.monotonic() - self.pending[request_id]) * 1000
+        delay = max(0, int(self.TYPING_DELAY_MS - elapsed_ms))
+        QTimer.singleShot(delay, lambda: self.deliver_response(request_id, lines, mood))
+
+    def deliver_response(self, request_id, lines, mood):
+        self.pending.pop(request_id, None)
+        self.record_mood(mood)
+        response = "<br><br>".join(line.replace("\n", "<br>") for line in lines)
         self.append_to_chat(f"<b>🤖 SerenityAI:</b> {response}")
-        self.status_bar.showMessage("Ready")
+        if not self.pending:
+            self.status_bar.showMessage("Ready")
 
-    def record_mood(self, message):
-        # Simple mood scoring for demo
-        score = 5  # Neutral
-        if "sad" in message.lower() or "depressed" in message.lower():
-            score = random.randint(1, 3)
-        elif "happy" in message.lower() or "good" in message.lower():
-            score = random.randint(7, 10)
-        
-        self.mood_history.append({
-            "timestamp": datetime.now(),
-            "message": message,
-            "score": score
-        })
+    def record_mood(self, mood):
+        # Queued for a batched background write; never blocks the GUI
+        if mood is None:
+            return
+        self.mood_store.add_entry(mood)
+        if self.mood_dialog is not None:
+            self.mood_dialog.add_entry(mood)
 
     def start_quiz(self):
         quiz = QuizDialog(self)
         if quiz.exec_():
             total_score = quiz.get_score()
-            if total_score <= 4:
-                result = "minimal depression"
-                advice = "Your mood seems generally positive."
-            elif total_score <= 9:
-                result = "mild depression"
-                advice = "You might be experiencing some low mood."
-            elif total_score <= 14:
-                result = "moderate depression"
-                advice = "Consider speaking with a professional."
-            elif total_score <= 19:
-                result = "moderately severe depression"
-                advice = "Professional support could be helpful."
-            else:
-                result = "severe depression"
-                advice = "Please consider reaching out to a professional."
+            result, advice = phq9.severity(total_score)
             
             response = f"""
             <b>🤖 SerenityAI:</b> Assessment results suggest {result} (score: {total_score}/27).<br><br>
@@ -606,12 +660,15 @@ class SerenityChatbot(QMainWindow):
             self.append_to_chat(response)
 
     def show_mood_chart(self):
-        if not self.mood_history:
+        self.load_models()
+        # count() and series() include entries still queued for the writer
+        if not self.mood_store.count():
             self.append_to_chat("<b>🤖 SerenityAI:</b> No mood data yet. Chat more to track your mood.")
             return
         
-        dialog = MoodChartDialog(self.mood_history, self)
-        dialog.exec_()
+        self.mood_dialog = MoodChartDialog(self.mood_store.series(), self)
+        self.mood_dialog.exec_()
+        self.mood_dialog = None
 
     def toggle_voice_input(self):
         if self.is_listening:
@@ -622,37 +679,85 @@ class SerenityChatbot(QMainWindow):
     def start_voice_input(self):
         self.is_listening = True
         self.voice_button.setStyleSheet("background-color: #E74C3C;")
-        self.status_bar.showMessage("Listening... Speak now")
-        QApplication.processEvents()
+        self.status_bar.showMessage("Listening... Speak now (click the mic again to stop)")
         
         try:
-            with sr.Microphone() as source:
-                self.recognizer.adjust_for_ambient_noise(source)
-                audio = self.recognizer.listen(source, timeout=5)
-                
-                self.status_bar.showMessage("Processing...")
-                QApplication.processEvents()
-                
-                text = self.recognizer.recognize_google(audio)
-                self.input_field.setText(text)
-                self.status_bar.showMessage("Ready - press Send")
-                
-        except sr.WaitTimeoutError:
-            self.status_bar.showMessage("No speech detected")
-        except sr.UnknownValueError:
-            self.status_bar.showMessage("Could not understand audio")
+            import voice
+
+            recognizer = voice.RECOGNIZERS[self.recognizer_name]()
+            capture = voice.VoiceCapture(voice.MicrophoneSource(), recognizer)
         except Exception as e:
             self.status_bar.showMessage(f"Error: {str(e)}")
-        finally:
             self.stop_voice_input()
+            return
+        
+        self.voice_thread = VoiceCaptureThread(capture, self)
+        self.voice_thread.partial.connect(self.on_partial_transcript)
+        self.voice_thread.failed.connect(lambda error: self.status_bar.showMessage(f"Error: {error}"))
+        self.voice_thread.finished.connect(self.on_voice_finished)
+        self.voice_thread.start()
+
+    def on_partial_transcript(self, text):
+        self.input_field.setText(text)
+        self.status_bar.showMessage("Listening... " + text[-60:])
+
+    def on_voice_finished(self):
+        if self.input_field.text():
+            self.status_bar.showMessage("Ready - press Send")
+        elif self.status_bar.currentMessage().startswith("Listening"):
+            self.status_bar.showMessage("No speech detected")
+        self.voice_thread = None
+        self.stop_voice_input()
 
     def stop_voice_input(self):
+        if self.voice_thread is not None:
+            # Cancel the capture; the thread exits at the next audio frame and
+            # on_voice_finished resets the button.
+            self.voice_thread.cancel()
+            self.status_bar.showMessage("Stopping...")
+            return
         self.is_listening = False
         self.voice_button.setStyleSheet("background-color: #4A7685;")
         self.voice_button.setIcon(QIcon.fromTheme("audio-input-microphone"))
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    def closeEvent(self, event):
+        if self.voice_thread is not None:
+            self.voice_thread.cancel()
+            self.voice_thread.wait()
+        if self.mood_store is not None:
+            self.worker.stop()
+            self.mood_store.close()
+        self.chat_area.close_store()
+        super().closeEvent(event)
+
+class StartupProfiler:
+    # Wall-clock time of each startup phase, printed with --profile-startup
+    def __init__(self, enabled, start):
+        self.enabled = enabled
+        self.start = self.last = start
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        for phase, seconds in self.phases:
+            print(f"{phase:<20} {seconds * 1000:8.1f} ms", file=sys.stderr)
+        print(f"{'total':<20} {(self.last - self.start) * 1000:8.1f} ms", file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SerenityAI chat window")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print how long imports, widget construction, first paint and model load take")
+    args, qt_args = parser.parse_known_args(argv)
+    profiler = StartupProfiler(args.profile_startup, IMPORT_START)
+    profiler.mark("imports")
+
+    app = QApplication([sys.argv[0]] + qt_args)
     
     # Set application font
     font = QFont()
@@ -661,5 +766,14 @@ if __name__ == "__main__":
     app.setFont(font)
     
     window = SerenityChatbot()
+    profiler.mark("widget construction")
     window.show()
-    sys.exit(app.exec_())
\ No newline at end of file
+    app.processEvents()
+    profiler.mark("first paint")
+    window.load_models()
+    profiler.mark("model load")
+    profiler.report()
+    return app.exec_()
+
+if __name__ == "__main__":
+    sys.exit(main())
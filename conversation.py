@@ -0,0 +1,237 @@
+import asyncio
+import itertools
+import phq9
+
+# Headless version of the serenityai.py dialog: greet -> classify the
+# feeling -> offer the PHQ-9 quiz -> score -> check in or escalate. Each
+# Session holds only its own small state and ConversationEngine.step moves it
+# forward by one incoming message, so any number of sessions can share one
+# engine. Front ends (console, Qt, asyncio driver) only render Turn.lines.
+
+# Labels of the emotion classifiers that send the user towards the quiz
+NEGATIVE_LABELS = frozenset({"anger", "fear", "sadness"})
+CONFIDENT = 0.5
+YES = frozenset({"yes", "y", "yeah", "sure", "ok", "okay"})
+READY = frozenset({"okay", "ok"})
+
+ASK_NAME, FEELING, OFFER_QUIZ, QUIZ_READY, QUIZ, CHECK_IN, DONE = range(7)
+STATE_NAMES = ("ask_name", "feeling", "offer_quiz", "quiz_ready", "quiz", "check_in", "done")
+# States whose incoming message says how the user feels; names, quiz
+# answers and yes/okay confirmations are not moods
+MOOD_STATES = frozenset({FEELING, CHECK_IN, DONE})
+
+# Highest PHQ-9 total in the "minimal" band, which gets a check-in instead
+# of the helpline
+CHECK_IN_MAX_SCORE = 4
+
+HELPLINE = (
+    "We're really sorry to know that and for further assistance we would try to connect you with our local "
+    "assistance who is available 24/7",
+    "Here are the details",
+    "Contact Jeevan Suicide Prevention Hotline",
+    "Address: 171, Ambiga Street Golden George Nagar, Nerkundram, Chennai, Tamil Nadu 600107",
+    "Number: 044 2656 4444",
+)
+
+QUIZ_INTRO = (
+    "Now we're starting with a small assessment and hopefully at the end of the assessment, "
+    "we'll be able to evaluate your mental health",
+    "To respond please type the following answer depending upon your choice",
+    "A. not at all\nB. several days\nC. more than half the days\nD. nearly every day",
+    "Now we'll be starting with the quiz, type okay if you're ready!",
+)
+
+_session_ids = itertools.count(1)
+
+
+class Session:
+    __slots__ = ("id", "name", "state", "answers", "negative", "positive", "busy")
+
+    def __init__(self, session_id=None):
+        self.id = session_id if session_id is not None else next(_session_ids)
+        self.name = None
+        self.state = ASK_NAME
+        # PHQ-9 answers so far, one 0-3 value per question
+        self.answers = bytearray()
+        self.negative = 0
+        self.positive = 0
+        self.busy = False
+
+    @property
+    def state_name(self):
+        return STATE_NAMES[self.state]
+
+
+class Turn:
+    # Bot lines for one incoming message and the branch the engine took
+    __slots__ = ("lines", "decision", "finished")
+
+    def __init__(self, lines, decision, finished=False):
+        self.lines = lines
+        self.decision = decision
+        self.finished = finished
+
+
+class ConversationEngine:
+    # classifier: anything with predict(message) -> (label, probability).
+    # matcher: an intent_engine.IntentMatcher, responses: its reply per intent.
+    # small_talk(message) -> str keeps a finished conversation going (the Qt
+    # window); without it the session ends once the flow is done.
+    def __init__(self, classifier, matcher, responses, small_talk=None):
+        self.classifier = classifier
+        self.matcher = matcher
+        self.responses = responses
+        self.small_talk = small_talk
+        self.handlers = (self._ask_name, self._feeling, self._offer_quiz, self._quiz_ready,
+                         self._quiz, self._check_in, self._done)
+
+    def start(self, session):
+        session.state = ASK_NAME
+        return Turn(["What is your name?"], "ask_name")
+
+    def needs_prediction(self, session):
+        return session.state == FEELING
+
+    def expects_mood(self, session):
+        # Call before step(): whether the next message is a mood message
+        return session.state in MOOD_STATES
+
+    def step(self, session, message, prediction=None):
+        # prediction lets an async caller classify the message itself (for
+        # example through a MicroBatcher) before handing it to the engine
+        return self.handlers[session.state](session, message.strip(), prediction)
+
+    def _finish(self, session, lines, decision):
+        session.state = DONE
+        return Turn(lines, decision, finished=self.small_talk is None)
+
+    def _ask_name(self, session, message, prediction):
+        session.name = message
+        session.state = FEELING
+        return Turn([f"Hey {message}!", "How are you feeling today?"], "greeted")
+
+    def _feeling(self, session, message, prediction):
+        label, probability = prediction if prediction is not None else self.classifier.predict(message)
+        if label in NEGATIVE_LABELS:
+            session.negative += 1
+            lines = ["Oh, sorry to hear that!" if probability >= CONFIDENT else "Okay, thanks for sharing."]
+            return self._offer(session, lines, "negative")
+        session.positive += 1
+        lines = ["That's great to hear!" if probability >= CONFIDENT else "Okay, thanks for sharing.",
+                 f"Thanks for sharing {session.name}"]
+        return self._finish(session, lines, "positive")
+
+    def _offer(self, session, lines, decision):
+        session.state = OFFER_QUIZ
+        session.answers = bytearray()
+        lines += [
+            f"Hello {session.name}, it's good to know that you're comfortable opening up about depression.",
+            "We would try to assist you by taking a small quiz to further evaluate your mental health condition",
+            "Would that be okay?",
+        ]
+        return Turn(lines, decision)
+
+    def _offer_quiz(self, session, message, prediction):
+        if message.lower() in YES:
+            session.state = QUIZ_READY
+            return Turn(list(QUIZ_INTRO), "quiz_offered")
+        return self._finish(session, list(HELPLINE), "quiz_declined")
+
+    def _quiz_ready(self, session, message, prediction):
+        if message.lower() in READY:
+            session.state = QUIZ
+            return Turn([phq9.QUESTIONS[0]], "quiz_started")
+        # Same as the console flow: anything else starts over
+        session.state = ASK_NAME
+        return Turn(["What is your name?"], "restart")
+
+    def _quiz(self, session, message, prediction):
+        question = len(session.answers)
+        try:
+            value = phq9.answer_value(message)
+        except ValueError:
+            return Turn(["Invalid response. Please choose A, B, C, or D.", phq9.QUESTIONS[question]],
+                        "invalid_answer")
+        session.answers.append(value)
+        if len(session.answers) < len(phq9.QUESTIONS):
+            return Turn([phq9.QUESTIONS[question + 1]], "answered")
+        return self._score(session)
+
+    def _score(self, session):
+        result = phq9.score_answers(list(session.answers))
+        lines = [
+            "Thank you for taking the assessment!",
+            f"Your mental assessment score is {result['score']}/{result['max_score']} ({result['severity']})",
+        ]
+        if result["score"] <= CHECK_IN_MAX_SCORE and not result["self_harm_flag"]:
+            session.state = CHECK_IN
+            lines.append("Please make sure that you keep checking in with me. What's your mood now after opening up?")
+            return Turn(lines, "score_low")
+        return self._finish(session, lines + list(HELPLINE), "score_high")
+
+    def _check_in(self, session, message, prediction):
+        intent = self.matcher.intent(message.lower())
+        if intent == "depression":
+            return self._offer(session, [], "depression")
+        if intent == "happy":
+            return self._finish(session, ["Please ask me for help whenever you feel like it! I'm always online."],
+                                "happy")
+        if intent in self.responses and intent != "default":
+            return self._finish(session, [self.responses[intent]], intent)
+        return self._finish(session, list(HELPLINE), "extreme")
+
+    def _done(self, session, message, prediction):
+        if self.small_talk is None:
+            return Turn([], "finished", finished=True)
+        return Turn([self.small_talk(message)], "chat")
+
+
+class ConversationDriver:
+    # Runs many sessions on one event loop. With a batching.MicroBatcher the
+    # classifications of concurrent sessions share forward passes; pacing
+    # adds a delay per bot line, as the console does between prints.
+    def __init__(self, engine, batcher=None, pacing=0.0):
+        self.engine = engine
+        self.batcher = batcher
+        self.pacing = pacing
+        self.sessions = {}
+
+    def open(self, session_id=None):
+        session = Session(session_id)
+        self.sessions[session.id] = session
+        return session, self.engine.start(session)
+
+    def close(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    async def send(self, session_id, message):
+        session = self.sessions[session_id]
+        # One message at a time per session; the next one needs this turn's state
+        if session.busy:
+            raise RuntimeError(f"Session {session_id} is still handling a message")
+        session.busy = True
+        try:
+            prediction = None
+            if self.batcher is not None and self.engine.needs_prediction(session):
+                label, probability, _ = await self.batcher.predict_async(message)
+                prediction = (label, probability)
+            turn = self.engine.step(session, message, prediction)
+        finally:
+            session.busy = False
+        if self.pacing and turn.lines:
+            await asyncio.sleep(self.pacing * len(turn.lines))
+        if turn.finished:
+            self.close(session_id)
+        return turn
+
+    async def converse(self, messages):
+        # One complete session fed from a list of user messages; returns the
+        # opening turn followed by one turn per message sent
+        session, turn = self.open()
+        turns = [turn]
+        for message in messages:
+            if session.id not in self.sessions:
+                break
+            turns.append(await self.send(session.id, message))
+        self.close(session.id)
+        return turns
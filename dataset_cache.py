@@ -0,0 +1,216 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from artifacts import file_digest
+
+# Pre-parsed, optionally pre-tokenized copies of the semicolon-delimited CSV
+# splits, stored as memory-mapped NumPy files:
+#   labels.npy         int16 label codes (index into meta["classes"])
+#   text.npy           uint8 UTF-8 bytes of every message, back to back
+#   text_offsets.npy   int64, message i is text[offsets[i]:offsets[i + 1]]
+#   token_ids.npy      int32 token ids, back to back (tokenized caches only)
+#   token_offsets.npy  int64 offsets into token_ids
+# A cache directory is keyed by the CSV content, the label set and the
+# tokenizer, so editing any of them produces a new cache instead of a stale one.
+FORMAT_VERSION = 1
+CACHE_DIR = "dataset_cache"
+SPLITS = ("train.csv", "test.csv", "val.csv")
+MAX_LENGTH = 128
+
+
+def tokenizer_identity(tokenizer):
+    if tokenizer is None:
+        return None
+    vocab = sorted(tokenizer.get_vocab().items())
+    digest = hashlib.sha256(json.dumps(vocab).encode("utf-8")).hexdigest()
+    return f"{tokenizer.name_or_path}:{digest[:16]}"
+
+
+def cache_key(csv_path, classes, tokenizer_id, max_length=MAX_LENGTH):
+    payload = {
+        "format": FORMAT_VERSION,
+        "csv": file_digest(csv_path),
+        "classes": list(classes),
+        "tokenizer": tokenizer_id,
+        "max_length": max_length if tokenizer_id else None,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def split_dir(csv_path, key, cache_dir=CACHE_DIR):
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir, f"{name}-{key[:16]}")
+
+
+class PreparedSplit:
+    # Read-only, zero-copy view over a prepared cache directory
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.classes = np.asarray(self.meta["classes"])
+        self.labels = self._open("labels.npy")
+        self.text = self._open("text.npy")
+        self.text_offsets = self._open("text_offsets.npy")
+        self.tokenized = self.meta["tokenizer"] is not None
+        if self.tokenized:
+            self.token_ids = self._open("token_ids.npy")
+            self.token_offsets = self._open("token_offsets.npy")
+
+    def _open(self, name):
+        return np.load(os.path.join(self.directory, name), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.labels)
+
+    def message(self, i):
+        return bytes(self.text[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    def messages(self):
+        buffer = bytes(self.text)
+        offsets = self.text_offsets.tolist()
+        return [buffer[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(self))]
+
+    def label_names(self):
+        return self.classes[np.asarray(self.labels)].tolist()
+
+    def tokens(self, i):
+        return self.token_ids[self.token_offsets[i]:self.token_offsets[i + 1]]
+
+    def lengths(self):
+        return np.diff(self.token_offsets)
+
+
+def _write(directory, name, array):
+    np.save(os.path.join(directory, name), array)
+
+
+def prepare(csv_path, classes=None, tokenizer=None, cache_dir=CACHE_DIR, max_length=MAX_LENGTH):
+    # Returns the PreparedSplit for csv_path, building it on first use.
+    # classes defaults to the sorted label set of train.csv so codes agree
+    # with a LabelEncoder fitted on the training data.
+    if classes is None:
+        classes = train_classes()
+    tokenizer_id = tokenizer_identity(tokenizer)
+    key = cache_key(csv_path, classes, tokenizer_id, max_length)
+    directory = split_dir(csv_path, key, cache_dir)
+    if os.path.exists(os.path.join(directory, "meta.json")):
+        return PreparedSplit(directory)
+
+    import pandas as pd
+
+    frame = pd.read_csv(csv_path, delimiter=';')
+    messages = frame['message'].astype(str).tolist()
+    index = {label: code for code, label in enumerate(classes)}
+    unknown = set(frame['label']) - set(index)
+    if unknown:
+        raise ValueError(f"{csv_path} has labels missing from the class list: {sorted(unknown)}")
+
+    # Each build writes its own temporary directory, so concurrent builders
+    # of the same split never share files
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".", suffix=".tmp", dir=cache_dir)
+    _write(tmp_dir, "labels.npy", np.asarray([index[label] for label in frame['label']], dtype=np.int16))
+
+    encoded = [m.encode("utf-8") for m in messages]
+    text_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=text_offsets[1:])
+    _write(tmp_dir, "text.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    _write(tmp_dir, "text_offsets.npy", text_offsets)
+
+    if tokenizer is not None:
+        input_ids = tokenizer(messages, truncation=True, max_length=max_length)["input_ids"]
+        token_offsets = np.zeros(len(input_ids) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in input_ids], out=token_offsets[1:])
+        token_ids = np.fromiter((t for ids in input_ids for t in ids), dtype=np.int32, count=token_offsets[-1])
+        _write(tmp_dir, "token_ids.npy", token_ids)
+        _write(tmp_dir, "token_offsets.npy", token_offsets)
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "key": key,
+        "csv_path": csv_path,
+        "rows": len(messages),
+        "classes": [str(c) for c in classes],
+        "tokenizer": tokenizer_id,
+        "max_length": max_length if tokenizer is not None else None,
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    _publish(tmp_dir, directory)
+    return PreparedSplit(directory)
+
+
+def _publish(tmp_dir, directory):
+    # Directories are keyed by their content, so a complete one (it has
+    # meta.json) left by another builder is as good as ours. An incomplete
+    # one is moved aside first: renaming onto an existing directory fails on
+    # Windows, and on POSIX when it is not empty.
+    for _ in range(2):
+        try:
+            os.replace(tmp_dir, directory)
+            return
+        except OSError:
+            if not os.path.exists(directory):
+                raise
+        if os.path.exists(os.path.join(directory, "meta.json")):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        stale = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".", suffix=".stale",
+                                 dir=os.path.dirname(directory) or ".")
+        try:
+            os.replace(directory, os.path.join(stale, "old"))
+        except FileNotFoundError:
+            pass
+        shutil.rmtree(stale, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+
+
+def train_classes(train_path="train.csv"):
+    # Sorted label set of the training split, cached next to the splits so
+    # later runs do not need to parse the CSV to learn it.
+    digest = file_digest(train_path)
+    path = os.path.join(CACHE_DIR, f"classes-{digest[:16]}.json")
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    import csv
+
+    with open(train_path, encoding="utf-8") as f:
+        classes = sorted({row["label"] for row in csv.DictReader(f, delimiter=';')})
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(classes, f)
+    return classes
+
+
+def load_texts(csv_path):
+    # (messages, label names) for a split, from the text-only cache
+    split = prepare(csv_path)
+    return split.messages(), split.label_names()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare memory-mapped dataset caches")
+    parser.add_argument("splits", nargs="*", default=list(SPLITS))
+    parser.add_argument("--tokenizer", help="also tokenize with this tokenizer (e.g. serenity_model or distilbert-base-uncased)")
+    args = parser.parse_args(argv)
+
+    tokenizer = None
+    if args.tokenizer:
+        from transformers import DistilBertTokenizer
+        tokenizer = DistilBertTokenizer.from_pretrained(args.tokenizer)
+    for path in args.splits:
+        split = prepare(path, tokenizer=tokenizer)
+        extra = f", {len(split.token_ids)} tokens" if split.tokenized else ""
+        print(f"{path}: {len(split)} rows{extra} -> {split.directory}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
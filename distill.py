@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import joblib
+import prediction_cache
+import artifacts
+from artifacts import TfidfClassifier
+
+# Knowledge distillation from the fine-tuned DistilBERT model into a TF-IDF +
+# LogisticRegression student. The teacher scores train.csv once, in batches,
+# and its class distributions are cached on disk so later student fits (or an
+# interrupted teacher pass) never rerun the transformer. The student learns
+# the soft labels through the sample-weight expansion trick: every message is
+# repeated once per class with the teacher's probability as its weight.
+DISTILL_DIR = os.path.join(artifacts.ARTIFACT_DIR, "distill")
+STUDENT_PATH = os.path.join(artifacts.ARTIFACT_DIR, "student.joblib")
+# Expanded rows with a weight below this are dropped; they barely move the fit
+MIN_WEIGHT = 1e-3
+
+
+def teacher_key(teacher, train_path):
+    payload = {"model": teacher.load().artifact_version(), "train": artifacts.file_digest(train_path)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def soft_labels(teacher, split, train_path, batch_size=256, distill_dir=DISTILL_DIR):
+    # Teacher distribution for every row of the prepared split, columns in
+    # split.classes order. Written to a .npy memmap batch by batch; a
+    # progress file lets an interrupted pass resume where it stopped.
+    import numpy as np
+
+    directory = os.path.join(distill_dir, teacher_key(teacher, train_path))
+    path = os.path.join(directory, "soft_labels.npy")
+    progress_path = os.path.join(directory, "progress.json")
+    os.makedirs(directory, exist_ok=True)
+
+    done = 0
+    if os.path.exists(progress_path):
+        with open(progress_path) as f:
+            done = json.load(f)["rows"]
+    if done == 0 or not os.path.exists(path):
+        done = 0
+        probs = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(len(split), len(split.classes)))
+    else:
+        probs = np.load(path, mmap_mode="r+")
+
+    # Teacher columns follow its encoder; reorder them to the split's classes
+    columns = [list(teacher.classes_).index(c) for c in split.classes]
+    start = time.perf_counter()
+    for begin in range(done, len(split), batch_size):
+        end = min(begin + batch_size, len(split))
+        _, _, distribution = teacher.predict_batch([split.message(i) for i in range(begin, end)], batch_size=64)
+        probs[begin:end] = distribution[:, columns]
+        probs.flush()
+        with open(progress_path, "w") as f:
+            json.dump({"rows": end}, f)
+        print(f"\rteacher {end}/{len(split)} rows", end="", flush=True)
+    if done < len(split):
+        print(f"\nteacher pass took {time.perf_counter() - start:.1f}s")
+    return np.load(path, mmap_mode="r")
+
+
+def sharpen(probs, temperature):
+    # Re-temper softmax outputs: p ** (1 / T), renormalized. T > 1 softens.
+    import numpy as np
+
+    if temperature == 1.0:
+        return np.asarray(probs)
+    scaled = np.power(np.asarray(probs, dtype=np.float64), 1.0 / temperature)
+    return scaled / scaled.sum(axis=1, keepdims=True)
+
+
+def expand(X, soft, hard, alpha):
+    # One row per (message, class) with weight alpha * teacher + (1 - alpha) *
+    # gold label, dropping near-zero weights
+    import numpy as np
+
+    n, k = soft.shape
+    weights = alpha * soft
+    weights[np.arange(n), hard] += 1.0 - alpha
+    rows, cols = np.nonzero(weights >= MIN_WEIGHT)
+    return X[rows], cols, weights[rows, cols]
+
+
+def train_student(teacher, params=None, train_path=artifacts.TRAIN_PATH, temperature=1.0, alpha=1.0,
+                  batch_size=256, path=STUDENT_PATH):
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.preprocessing import LabelEncoder
+    from dataset_cache import prepare, train_classes
+
+    params = artifacts.resolve_params(params)
+    classes = train_classes(train_path)
+    train = prepare(train_path, classes)
+    soft = sharpen(soft_labels(teacher, train, train_path, batch_size), temperature)
+    hard = np.asarray(train.labels, dtype=np.int64)
+
+    start = time.perf_counter()
+    vectorizer = TfidfVectorizer(**artifacts.vectorizer_params(params))
+    X = vectorizer.fit_transform(train.messages()).tocsr()
+    X_expanded, y, weights = expand(X, soft, hard, alpha)
+    model = LogisticRegression(**dict(params["classifier"], class_weight=None, max_iter=1000))
+    model.fit(X_expanded, y, sample_weight=weights)
+
+    bundle = {
+        "version": artifacts.BUNDLE_VERSION,
+        "key": teacher_key(teacher, train_path) + f"-T{temperature}-a{alpha}",
+        "params": params,
+        "temperature": temperature,
+        "alpha": alpha,
+        "expanded_rows": int(len(y)),
+        "fit_seconds": round(time.perf_counter() - start, 3),
+        "classes": [str(c) for c in classes],
+        "vectorizer": vectorizer,
+        "model": model,
+        "encoder": LabelEncoder().fit(classes),
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    joblib.dump(bundle, tmp_path)
+    os.replace(tmp_path, path)
+    return bundle
+
+
+class StudentClassifier(TfidfClassifier):
+    # The distilled student behind the TfidfClassifier interface
+    namespace = "student"
+
+    def __init__(self, path=STUDENT_PATH, cache=prediction_cache.shared):
+        super().__init__(cache=cache)
+        self.path = path
+
+    def load(self):
+        if self.bundle is None:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"'{self.path}' is missing (run: python distill.py train)")
+            self.bundle = joblib.load(self.path)
+            self.classes_ = self.bundle["encoder"].classes_
+        return self
+
+
+def evaluate(classifier, messages, gold, samples=300, batch_size=64):
+    from benchmark import macro_f1, percentile
+
+    classifier.load()
+    classifier.predict(messages[0])
+    start = time.perf_counter()
+    labels, _, _ = classifier.predict_batch(messages, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+    labels = [str(label) for label in labels]
+
+    latencies = []
+    for message in messages[:samples]:
+        start = time.perf_counter()
+        classifier.predict(message)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        "labels": labels,
+        "accuracy": sum(p == g for p, g in zip(labels, gold)) / len(gold),
+        "macro_f1": macro_f1(gold, labels),
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "batch_msgs_per_s": len(messages) / batch_seconds,
+    }
+
+
+def compare(teacher, test_path=artifacts.TEST_PATH, samples=300):
+    from dataset_cache import load_texts
+
+    messages, gold = load_texts(test_path)
+    rows = {
+        "teacher": evaluate(teacher, messages, gold, samples),
+        "student": evaluate(StudentClassifier(cache=None), messages, gold, samples),
+        "tfidf": evaluate(TfidfClassifier(cache=None), messages, gold, samples),
+    }
+    reference = rows["teacher"]["labels"]
+    for row in rows.values():
+        row["teacher_agreement"] = sum(a == b for a, b in zip(row.pop("labels"), reference)) / len(reference)
+    return rows
+
+
+def print_table(rows):
+    print(f"{'model':<8} {'acc':>7} {'macroF1':>8} {'agree':>7} {'p50 ms':>8} {'p99 ms':>8} {'batch/s':>9}")
+    for name, row in rows.items():
+        print(f"{name:<8} {row['accuracy']:>7.4f} {row['macro_f1']:>8.4f} {row['teacher_agreement']:>7.4f} "
+              f"{row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} {row['batch_msgs_per_s']:>9.0f}")
+
+
+def main(argv=None):
+    from model import SerenityModel
+
+    parser = argparse.ArgumentParser(description="Distill SerenityModel into a TF-IDF/LR student")
+    parser.add_argument("--backend", default="torch", help="teacher inference backend")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fit = sub.add_parser("train", help="cache teacher soft labels, fit the student and compare")
+    fit.add_argument("--temperature", type=float, default=1.0)
+    fit.add_argument("--alpha", type=float, default=1.0, help="weight of soft labels vs gold labels")
+    fit.add_argument("--batch-size", type=int, default=256, help="teacher rows per cached batch")
+    fit.add_argument("--no-compare", action="store_true")
+
+    cmp_ = sub.add_parser("compare", help="accuracy vs latency of teacher, student and TF-IDF/LR on test.csv")
+    cmp_.add_argument("--samples", type=int, default=300, help="messages used for latency percentiles")
+    cmp_.add_argument("--json", help="also write the table to this path")
+
+    args = parser.parse_args(argv)
+    teacher = SerenityModel(backend=args.backend, cache=None)
+
+    if args.command == "train":
+        bundle = train_student(teacher, temperature=args.temperature, alpha=args.alpha, batch_size=args.batch_size)
+        print(f"student fitted on {bundle['expanded_rows']} weighted rows in {bundle['fit_seconds']:.1f}s "
+              f"-> {STUDENT_PATH}")
+        if args.no_compare:
+            return 0
+        rows = compare(teacher)
+    else:
+        rows = compare(teacher, samples=args.samples)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(rows, f, indent=2)
+    print_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import numpy as np
+
+# Shape-preserving downsampling for long time series.
+
+
+def lttb(x, y, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the first and last points and,
+    # from each bucket in between, the point forming the largest triangle with
+    # the previously kept point and the mean of the next bucket.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_end = edges[i + 1], edges[i + 2]
+        else:
+            next_start, next_end = n - 1, n
+        mean_x = x[next_start:next_end].mean()
+        mean_y = y[next_start:next_end].mean()
+        ax, ay = x[previous], y[previous]
+        area = np.abs((ax - mean_x) * (y[start:end] - ay) - (ax - x[start:end]) * (mean_y - ay))
+        previous = start + int(area.argmax())
+        keep[i + 1] = previous
+    return x[keep], y[keep]
@@ -0,0 +1,259 @@
+import csv
+import queue
+import logging
+import itertools
+import sqlite3
+import threading
+from datetime import datetime
+
+# SQLite-backed persistence for chat history. Writes are queued and committed
+# in batches by a background thread so callers on the GUI thread never wait
+# on disk; reads use their own connection, which WAL mode lets run
+# concurrently with the writer, and merge in queued writes that are not
+# committed yet instead of waiting for them.
+DB_PATH = "serenity_history.db"
+
+logger = logging.getLogger("serenity.history")
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return value.timestamp()
+
+
+class SQLiteStore:
+    SCHEMA = ()
+
+    def __init__(self, path=DB_PATH, batch_size=64, flush_interval=0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+        self.pending = queue.Queue()
+        # Params of queued writes until the writer commits (or drops) them
+        self.uncommitted = {}
+        self.write_ids = itertools.count()
+        self.write_lock = threading.Lock()
+        self.writer = threading.Thread(target=self._write_loop, name=f"{type(self).__name__}-writer", daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+
+    def _enqueue(self, sql, params):
+        with self.write_lock:
+            write_id = next(self.write_ids)
+            self.uncommitted[write_id] = params
+        self.pending.put((write_id, sql, params))
+
+    def _read(self, query):
+        # query(conn) together with the params of the writes still queued.
+        # The writer commits a batch and forgets it under the same lock, so
+        # each row is seen exactly once and a reader waits at most for one
+        # commit, never for the batching window.
+        with self.write_lock:
+            return query(self._reader()), list(self.uncommitted.values())
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            item = self.pending.get()
+            if item is None:
+                self.pending.task_done()
+                break
+            # A flush request (an Event) commits the open batch at once
+            # instead of waiting out flush_interval
+            flushed = item if isinstance(item, threading.Event) else None
+            batch = [] if flushed else [item]
+            # Gather whatever else arrives within flush_interval, up to batch_size
+            while flushed is None and len(batch) < self.batch_size:
+                try:
+                    item = self.pending.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self.pending.put(None)
+                    self.pending.task_done()
+                    break
+                if isinstance(item, threading.Event):
+                    flushed = item
+                    break
+                batch.append(item)
+            try:
+                if batch:
+                    with self.write_lock:
+                        self._write_batch(conn, batch)
+                        for write_id, _, _ in batch:
+                            del self.uncommitted[write_id]
+            finally:
+                # flush() waits on these; a failed batch must not hang it
+                for _ in range(len(batch) + (flushed is not None)):
+                    self.pending.task_done()
+                if flushed is not None:
+                    flushed.set()
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        try:
+            with conn:
+                for _, sql, params in batch:
+                    conn.execute(sql, params)
+            return
+        except Exception:
+            logger.exception("Batch of %d writes failed; retrying one by one", len(batch))
+        # The batch was rolled back; keep every write that succeeds alone
+        for _, sql, params in batch:
+            try:
+                with conn:
+                    conn.execute(sql, params)
+            except Exception:
+                logger.exception("Dropped write: %s", sql)
+
+    def flush(self):
+        # Block until every write queued so far is committed
+        if not self.writer.is_alive():
+            return
+        flushed = threading.Event()
+        self.pending.put(flushed)
+        flushed.wait()
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+class MoodStore(SQLiteStore):
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS mood_entries (
+            id INTEGER PRIMARY KEY,
+            ts REAL NOT NULL,
+            message TEXT NOT NULL,
+            score INTEGER NOT NULL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_mood_entries_ts ON mood_entries (ts)",
+    )
+
+    def add(self, timestamp, message, score):
+        self._enqueue("INSERT INTO mood_entries (ts, message, score) VALUES (?, ?, ?)",
+                      (_to_epoch(timestamp), message, score))
+
+    def add_entry(self, entry):
+        self.add(entry["timestamp"], entry["message"], entry["score"])
+
+    def _where(self, start, end):
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("ts >= ?")
+            params.append(_to_epoch(start))
+        if end is not None:
+            clauses.append("ts < ?")
+            params.append(_to_epoch(end))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _queued(self, queued, start, end):
+        # Uncommitted (ts, message, score) entries in [start, end)
+        start, end = _to_epoch(start), _to_epoch(end)
+        return [row for row in queued if (start is None or row[0] >= start) and (end is None or row[0] < end)]
+
+    def count(self, start=None, end=None):
+        where, params = self._where(start, end)
+        total, queued = self._read(
+            lambda conn: conn.execute("SELECT COUNT(*) FROM mood_entries" + where, params).fetchone()[0])
+        return total + len(self._queued(queued, start, end))
+
+    def range(self, start=None, end=None, limit=None):
+        # Entries in [start, end) ordered by time, as the dicts the chat window
+        # records (timestamp, message, score)
+        where, params = self._where(start, end)
+        sql = "SELECT ts, message, score FROM mood_entries" + where + " ORDER BY ts"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows, queued = self._read(lambda conn: conn.execute(sql, params).fetchall())
+        queued = self._queued(queued, start, end)
+        if queued:
+            rows = sorted(rows + queued, key=lambda row: row[0])[:limit]
+        return [
+            {"timestamp": datetime.fromtimestamp(ts), "message": message, "score": score}
+            for ts, message, score in rows
+        ]
+
+    def series(self, start=None, end=None):
+        # (epoch seconds, score) pairs only, for plotting large histories
+        where, params = self._where(start, end)
+        rows, queued = self._read(
+            lambda conn: conn.execute("SELECT ts, score FROM mood_entries" + where + " ORDER BY ts", params).fetchall())
+        queued = self._queued(queued, start, end)
+        if queued:
+            rows = sorted(rows + [(ts, score) for ts, _, score in queued], key=lambda row: row[0])
+        return rows
+
+    def daily_stats(self, start=None, end=None):
+        # Aggregated in SQL, so queued entries are committed first
+        self.flush()
+        where, params = self._where(start, end)
+        sql = ("SELECT date(ts, 'unixepoch', 'localtime') AS day, AVG(score), MIN(score), MAX(score), COUNT(*)"
+               " FROM mood_entries" + where + " GROUP BY day ORDER BY day")
+        return [
+            {"day": day, "mean": mean, "min": low, "max": high, "count": count}
+            for day, mean, low, high, count in self._reader().execute(sql, params)
+        ]
+
+    def export_csv(self, path, start=None, end=None):
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp", "message", "score"])
+            for entry in self.range(start, end):
+                writer.writerow([entry["timestamp"].isoformat(), entry["message"], entry["score"]])
+
+
+class TranscriptStore(SQLiteStore):
+    # Chat messages paged out of the on-screen transcript. Messages are
+    # numbered per session so a page can be fetched back by sequence.
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS transcript (
+            session TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            ts REAL NOT NULL,
+            is_user INTEGER NOT NULL,
+            html TEXT NOT NULL,
+            PRIMARY KEY (session, seq)
+        )""",
+    )
+
+    def add(self, session, seq, html, is_user, timestamp=None):
+        timestamp = _to_epoch(timestamp) if timestamp is not None else datetime.now().timestamp()
+        self._enqueue("INSERT OR REPLACE INTO transcript (session, seq, ts, is_user, html) VALUES (?, ?, ?, ?, ?)",
+                      (session, seq, timestamp, int(is_user), html))
+
+    def page(self, session, before_seq, limit):
+        # Up to limit messages older than before_seq, oldest first. Messages
+        # still queued for the writer come from memory.
+        rows, queued = self._read(lambda conn: conn.execute(
+            "SELECT seq, html, is_user FROM transcript WHERE session = ? AND seq < ? ORDER BY seq DESC LIMIT ?",
+            (session, before_seq, limit),
+        ).fetchall())
+        if queued:
+            merged = {seq: (seq, html, is_user) for seq, html, is_user in rows}
+            for row_session, seq, _, is_user, html in queued:
+                if row_session == session and seq < before_seq:
+                    merged[seq] = (seq, html, is_user)
+            rows = sorted(merged.values(), reverse=True)[:limit]
+        return [(seq, html, bool(is_user)) for seq, html, is_user in reversed(rows)]
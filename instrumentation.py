@@ -0,0 +1,306 @@
+import os
+import sys
+import json
+import time
+import atexit
+import bisect
+import logging
+import argparse
+import threading
+
+# Opt-in per-stage latency and input-size metrics for the classifiers.
+# Disabled by default: trace() then hands back a shared no-op object, so an
+# instrumented predict pays one function call and a few no-op context
+# managers. Enable with SERENITY_METRICS=1 (or enable()); the counters can be
+# read as Prometheus text (dump(), the server's /metrics) and every call can
+# also be written as a JSON log line.
+STAGE_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+TOKEN_BUCKETS = (1, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+
+logger = logging.getLogger("serenity.metrics")
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages = {}  # (model, stage) -> Histogram of seconds
+        self.tokens = {}  # model -> Histogram of input tokens per call
+        self.calls = {}  # model -> predict calls
+        self.messages = {}  # model -> messages scored
+
+    def record(self, model, messages, stages, tokens):
+        with self.lock:
+            self.calls[model] = self.calls.get(model, 0) + 1
+            self.messages[model] = self.messages.get(model, 0) + messages
+            for stage, seconds in stages.items():
+                histogram = self.stages.get((model, stage))
+                if histogram is None:
+                    histogram = self.stages[(model, stage)] = Histogram(STAGE_BUCKETS)
+                histogram.observe(seconds)
+            if tokens is not None:
+                histogram = self.tokens.get(model)
+                if histogram is None:
+                    histogram = self.tokens[model] = Histogram(TOKEN_BUCKETS)
+                histogram.observe(tokens)
+
+    def clear(self):
+        with self.lock:
+            self.stages.clear()
+            self.tokens.clear()
+            self.calls.clear()
+            self.messages.clear()
+
+    def prometheus(self):
+        lines = []
+        with self.lock:
+            lines.append("# HELP serenity_stage_seconds Time spent in each inference stage per call")
+            lines.append("# TYPE serenity_stage_seconds histogram")
+            for (model, stage), histogram in sorted(self.stages.items()):
+                _histogram_lines(lines, "serenity_stage_seconds", f'model="{model}",stage="{stage}"', histogram)
+            lines.append("# HELP serenity_input_tokens Input tokens (or nonzero features) per call")
+            lines.append("# TYPE serenity_input_tokens histogram")
+            for model, histogram in sorted(self.tokens.items()):
+                _histogram_lines(lines, "serenity_input_tokens", f'model="{model}"', histogram)
+            lines.append("# HELP serenity_calls_total Instrumented predict calls")
+            lines.append("# TYPE serenity_calls_total counter")
+            for model, count in sorted(self.calls.items()):
+                lines.append(f'serenity_calls_total{{model="{model}"}} {count}')
+            lines.append("# HELP serenity_messages_total Messages scored")
+            lines.append("# TYPE serenity_messages_total counter")
+            for model, count in sorted(self.messages.items()):
+                lines.append(f'serenity_messages_total{{model="{model}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+def _histogram_lines(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.bounds, histogram.counts):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.9g}")
+    lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+
+class _Stage:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        # A stage entered several times in one call (per batch) accumulates
+        stages = self.trace.stages
+        stages[self.name] = stages.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+class Trace:
+    __slots__ = ("model", "messages", "stages", "token_count", "start")
+
+    def __init__(self, model, messages):
+        self.model = model
+        self.messages = messages
+        self.stages = {}
+        self.token_count = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total = time.perf_counter() - self.start
+        self.stages["total"] = total
+        registry.record(self.model, self.messages, self.stages, self.token_count)
+        if log_calls:
+            logger.info(json.dumps({
+                "event": "predict",
+                "model": self.model,
+                "messages": self.messages,
+                "tokens": self.token_count,
+                "stages_ms": {stage: round(seconds * 1000, 4) for stage, seconds in self.stages.items()},
+                "error": exc_type.__name__ if exc_type else None,
+            }))
+        return False
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def tokens(self, count):
+        self.token_count = (self.token_count or 0) + int(count)
+
+
+class _NullTrace:
+    # Shared stand-in while metrics are disabled; every method is a no-op
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def stage(self, name):
+        return self
+
+    def tokens(self, count):
+        pass
+
+
+NULL_TRACE = _NullTrace()
+registry = Registry()
+enabled = os.environ.get("SERENITY_METRICS", "") not in ("", "0")
+log_calls = False
+
+
+def trace(model, messages=1):
+    if not enabled:
+        return NULL_TRACE
+    return Trace(model, messages)
+
+
+def enable(log_path=None, dump_path=None):
+    # log_path: append one JSON line per instrumented call.
+    # dump_path: write the Prometheus text there when the process exits.
+    global enabled, log_calls
+    enabled = True
+    if log_path:
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        log_calls = True
+    if dump_path:
+        atexit.register(dump, dump_path)
+
+
+def disable():
+    global enabled, log_calls
+    enabled = False
+    log_calls = False
+
+
+def dump(path=None):
+    text = registry.prometheus()
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
+
+
+if enabled:
+    enable(os.environ.get("SERENITY_METRICS_LOG"), os.environ.get("SERENITY_METRICS_DUMP"))
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process in MB, or None where it cannot
+    # be read (Windows without psutil)
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        peak = getattr(psutil.Process().memory_info(), "peak_wset", None)
+        return peak / (1 << 20) if peak is not None else None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux and the BSDs
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+def overhead(calls=200000):
+    # Cost per call of a three-stage trace, disabled and enabled, against
+    # the same code with no instrumentation
+    def bare():
+        for _ in range(calls):
+            pass
+
+    def traced():
+        for _ in range(calls):
+            with trace("overhead") as t:
+                with t.stage("a"):
+                    pass
+                with t.stage("b"):
+                    pass
+                with t.stage("c"):
+                    pass
+                t.tokens(1)
+
+    global enabled
+    previous = enabled
+    timings = {}
+    start = time.perf_counter()
+    bare()
+    timings["bare"] = time.perf_counter() - start
+    for state in (False, True):
+        enabled = state
+        start = time.perf_counter()
+        traced()
+        timings["enabled" if state else "disabled"] = time.perf_counter() - start
+    enabled = previous
+    with registry.lock:
+        registry.stages = {k: v for k, v in registry.stages.items() if k[0] != "overhead"}
+        registry.tokens.pop("overhead", None)
+        registry.calls.pop("overhead", None)
+        registry.messages.pop("overhead", None)
+    return {name: (seconds - timings["bare"]) / calls * 1e9 for name, seconds in timings.items() if name != "bare"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage inference metrics")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    prof = sub.add_parser("profile", help="score messages with metrics on and print the Prometheus dump")
+    prof.add_argument("--model", default="tfidf", choices=("tfidf", "distilbert"))
+    prof.add_argument("--limit", type=int, default=500, help="test.csv messages to score")
+    prof.add_argument("--batch-size", type=int, default=32)
+    prof.add_argument("--log", help="also write one JSON line per call here")
+
+    cost = sub.add_parser("overhead", help="measure the per-call cost of instrumentation")
+    cost.add_argument("--calls", type=int, default=200000)
+
+    args = parser.parse_args(argv)
+
+    if args.command == "overhead":
+        for name, ns in overhead(args.calls).items():
+            print(f"{name:<9} {ns:8.1f} ns per traced call")
+        return 0
+
+    from benchmark import create
+    from dataset_cache import load_texts
+
+    enable(log_path=args.log)
+    classifier = create(args.model).load()
+    messages = load_texts("test.csv")[0][:args.limit]
+    for message in messages[:50]:
+        classifier.predict(message)
+    for start in range(0, len(messages), args.batch_size):
+        classifier.predict_batch(messages[start:start + args.batch_size], batch_size=args.batch_size)
+    sys.stdout.write(dump())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,156 @@
+import re
+import sys
+import csv
+import json
+import time
+import random
+import string
+import argparse
+
+INTENTS_PATH = "intents.json"
+
+
+def load_intents(path=INTENTS_PATH):
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["intents"], data["responses"]
+
+
+def _trie_pattern(node):
+    # Turn a character trie into a regex where shared prefixes are matched
+    # once, so the engine walks the message a single time instead of trying
+    # every synonym at every position.
+    terminal = "" in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+    if not branches:
+        return ""
+    if len(branches) == 1 and not terminal:
+        return branches[0]
+    body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if terminal else body
+
+
+class IntentMatcher:
+    # Compiles every synonym of every intent into one word-bounded pattern.
+    # A synonym listed under several intents belongs to the first of them.
+    def __init__(self, intents):
+        self.priority = {name: i for i, name in enumerate(intents)}
+        self.lookup = {}
+        for name, synonyms in intents.items():
+            for synonym in synonyms:
+                self.lookup.setdefault(synonym.lower(), name)
+
+        trie = {}
+        for synonym in self.lookup:
+            node = trie
+            for ch in synonym:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        if self.lookup:
+            self.pattern = re.compile(r"(?<!\w)" + _trie_pattern(trie) + r"(?!\w)", re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    @classmethod
+    def from_file(cls, path=INTENTS_PATH):
+        intents, _ = load_intents(path)
+        return cls(intents)
+
+    def matches(self, message):
+        # All matches in one scan as (intent, start, end, synonym)
+        if self.pattern is None:
+            return []
+        found = []
+        for match in self.pattern.finditer(message):
+            synonym = match.group(0).lower()
+            found.append((self.lookup[synonym], match.start(), match.end(), synonym))
+        return found
+
+    def intents(self, message):
+        # Distinct matched intents, in the order they appear in the message
+        seen = []
+        for name, _, _, _ in self.matches(message):
+            if name not in seen:
+                seen.append(name)
+        return seen
+
+    def intent(self, message, default='default'):
+        # Same answer as the old per-key loop: the first intent in file order
+        # that matches anywhere in the message.
+        found = self.intents(message)
+        if not found:
+            return default
+        return min(found, key=self.priority.__getitem__)
+
+
+def legacy_intent(intents, message):
+    for words in intents.keys():
+        pattern = re.compile('|'.join([syn for syn in intents[words]]))
+        match = pattern.search(message)
+        if match:
+            return words
+    return 'default'
+
+
+def synthetic_intents(base, total_synonyms, seed=0):
+    rng = random.Random(seed)
+    intents = {name: list(synonyms) for name, synonyms in base.items() if name != 'default'}
+    names = list(intents)
+    count = sum(len(s) for s in intents.values())
+    while count < total_synonyms:
+        word = "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+        intents[names[count % len(names)]].append(word)
+        count += 1
+    intents['default'] = []
+    return intents
+
+
+def benchmark(sizes, messages):
+    base, _ = load_intents()
+    rows = []
+    for size in sizes:
+        intents = synthetic_intents(base, size)
+        start = time.perf_counter()
+        matcher = IntentMatcher(intents)
+        compile_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for message in messages:
+            matcher.intent(message)
+        engine_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for message in messages:
+            legacy_intent(intents, message)
+        legacy_s = time.perf_counter() - start
+        rows.append((size, compile_s, legacy_s, engine_s))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Match intents from intents.json")
+    sub = parser.add_subparsers(dest="command", required=True)
+    match = sub.add_parser("match", help="show every intent matched in a message")
+    match.add_argument("message")
+    bench = sub.add_parser("bench", help="compare against the per-message regex loop")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[12, 100, 1000, 5000])
+    bench.add_argument("--messages", type=int, default=2000, help="messages taken from test.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "match":
+        matcher = IntentMatcher.from_file()
+        for name, start, end, synonym in matcher.matches(args.message.lower()):
+            print(f"{name:<20} {start:>4}-{end:<4} {synonym}")
+        print("intent:", matcher.intent(args.message.lower()))
+    elif args.command == "bench":
+        with open("test.csv", encoding="utf-8") as f:
+            messages = [row["message"] for row in csv.DictReader(f, delimiter=';')][:args.messages]
+        print(f"{'synonyms':>9} {'compile ms':>11} {'legacy msg/s':>13} {'engine msg/s':>13} {'speedup':>8}")
+        for size, compile_s, legacy_s, engine_s in benchmark(args.sizes, messages):
+            print(f"{size:>9} {compile_s * 1000:>11.1f} {len(messages) / legacy_s:>13.0f} "
+                  f"{len(messages) / engine_s:>13.0f} {legacy_s / engine_s:>7.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
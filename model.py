@@ -1,80 +1,425 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
 import pandas as pd
-from transformers import DistilBertTokenizer, DistilBertForSequenceClassification, Trainer, TrainingArguments
+from transformers import (DistilBertTokenizer, DistilBertForSequenceClassification, Trainer, TrainingArguments,
+                          TrainerCallback, default_data_collator)
+from transformers.trainer_pt_utils import LengthGroupedSampler
 from sklearn.preprocessing import LabelEncoder
 import torch
 import joblib
+import hashlib
+import prediction_cache
+import dataset_cache
+import instrumentation
+from artifacts import file_digest
+from backends import BACKENDS, TorchBackend, create_backend
+
+BASE_MODEL = "distilbert-base-uncased"
+MODEL_DIR = "serenity_model"
+ENCODER_PATH = "encoder.pkl"
+MANIFEST_NAME = "serenity_manifest.json"
+TRAIN_PATH = "train.csv"
+TEST_PATH = "test.csv"
+MAX_LENGTH = 128
+
+
+class ModelArtifactError(RuntimeError):
+    pass
+
+
+class EmotionDataset(torch.utils.data.Dataset):
+    def __init__(self, encodings, labels):
+        self.encodings = encodings
+        self.labels = labels
+    def __getitem__(self, idx):
+        item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
+        item['labels'] = torch.tensor(self.labels[idx])
+        return item
+    def __len__(self):
+        return len(self.labels)
+
+
+class PackedEmotionDataset(torch.utils.data.Dataset):
+    # All token ids live in one contiguous 1-D tensor with per-example
+    # offsets; items are unpadded views into it, padding is left to the
+    # collator.
+    # The arrays may be read-only memory maps from dataset_cache; only the
+    # slice for one item is ever copied.
+    def __init__(self, token_ids, offsets, labels):
+        self.token_ids = token_ids
+        self.offsets = offsets
+        self.labels = labels
+
+    @classmethod
+    def from_split(cls, split):
+        return cls(split.token_ids, split.token_offsets, split.labels)
+
+    @classmethod
+    def from_texts(cls, tokenizer, texts, labels, max_length=MAX_LENGTH):
+        input_ids = tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+        offsets = np.zeros(len(input_ids) + 1, dtype=np.int64)
+        np.cumsum([len(ids) for ids in input_ids], out=offsets[1:])
+        token_ids = np.fromiter((t for ids in input_ids for t in ids), dtype=np.int32, count=offsets[-1])
+        return cls(token_ids, offsets, np.asarray(labels))
+
+    def lengths(self):
+        # Token count of every example, straight from the offsets
+        return np.diff(self.offsets).tolist()
+
+    def __getitem__(self, idx):
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return {
+            "input_ids": torch.from_numpy(np.array(self.token_ids[start:end], dtype=np.int64)),
+            "labels": torch.tensor(int(self.labels[idx])),
+        }
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class DynamicPaddingCollator:
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        longest = max(len(f["input_ids"]) for f in features)
+        input_ids = torch.full((len(features), longest), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), longest), dtype=torch.long)
+        for row, feature in enumerate(features):
+            length = len(feature["input_ids"])
+            input_ids[row, :length] = feature["input_ids"]
+            attention_mask[row, :length] = 1
+        labels = torch.stack([torch.as_tensor(f["labels"]) for f in features])
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+class CountingCollator:
+    # Wraps a collator and counts real and padded tokens handed to the model
+    def __init__(self, collator):
+        self.collator = collator
+        self.real_tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features):
+        batch = self.collator(features)
+        self.padded_tokens += batch["input_ids"].numel()
+        self.real_tokens += int(batch["attention_mask"].sum())
+        return batch
+
+
+class PackedTrainer(Trainer):
+    # group_by_length for a PackedEmotionDataset takes the lengths from its
+    # offsets; the stock sampler would index (and copy) every item to
+    # measure it
+    def _get_train_sampler(self, *args, **kwargs):
+        dataset = args[0] if args else kwargs.get("train_dataset", self.train_dataset)
+        if self.args.group_by_length and isinstance(dataset, PackedEmotionDataset):
+            return LengthGroupedSampler(self.args.train_batch_size * self.args.gradient_accumulation_steps,
+                                        lengths=dataset.lengths())
+        return super()._get_train_sampler(*args, **kwargs)
+
+
+class ThroughputCallback(TrainerCallback):
+    def __init__(self, collator):
+        self.collator = collator
+        self.epochs = []
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self.start = time.perf_counter()
+        self.real_start = self.collator.real_tokens
+        self.padded_start = self.collator.padded_tokens
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        seconds = time.perf_counter() - self.start
+        real = self.collator.real_tokens - self.real_start
+        padded = self.collator.padded_tokens - self.padded_start
+        epoch = {
+            "epoch_seconds": round(seconds, 2),
+            "tokens_per_second": round(real / seconds, 1),
+            "padded_tokens_per_second": round(padded / seconds, 1),
+            "padding_fraction": round(1 - real / padded, 4) if padded else 0.0,
+        }
+        self.epochs.append(epoch)
+        print(f"Epoch {len(self.epochs)}: {epoch['epoch_seconds']}s, {epoch['tokens_per_second']} tokens/s, "
+              f"{epoch['padding_fraction']:.1%} padding")
+
+    def report(self, padding):
+        return {"padding": padding, "epochs": self.epochs}
+
 
 class SerenityModel:
-    def __init__(self):
-        self.tokenizer = DistilBertTokenizer.from_pretrained("distilbert-base-uncased")
-        self.model = DistilBertForSequenceClassification.from_pretrained("distilbert-base-uncased", num_labels=6)  # Adjust num_labels based on your labels
-        self.encoder = LabelEncoder()
-        self.train_model()
-
-    def train_model(self):
-        train = pd.read_csv("train.csv", delimiter=';')
-        test = pd.read_csv("test.csv", delimiter=';')
-        
-        # Encode labels
-        labels = self.encoder.fit_transform(train['label'])
-        train_texts = train['message'].tolist()
-        test_texts = test['message'].tolist()
-        
-        # Tokenize data
-        train_encodings = self.tokenizer(train_texts, truncation=True, padding=True, max_length=128)
-        test_encodings = self.tokenizer(test_texts, truncation=True, padding=True, max_length=128)
-        
-        # Create dataset
-        class EmotionDataset(torch.utils.data.Dataset):
-            def __init__(self, encodings, labels):
-                self.encodings = encodings
-                self.labels = labels
-            def __getitem__(self, idx):
-                item = {key: torch.tensor(val[idx]) for key, val in self.encodings.items()}
-                item['labels'] = torch.tensor(self.labels[idx])
-                return item
-            def __len__(self):
-                return len(self.labels)
-        
-        train_dataset = EmotionDataset(train_encodings, labels)
-        test_dataset = EmotionDataset(test_encodings, self.encoder.transform(test['label']))
-        
+    # Construction is cheap: the tokenizer, weights and label encoder are
+    # loaded from disk on first use. Use SerenityModel.train() to fine-tune.
+    # backend selects the inference runtime: "torch" (fp32), "int8" or "onnx".
+    # Single-message predictions go through cache (pass None to disable).
+    def __init__(self, model_dir=MODEL_DIR, encoder_path=ENCODER_PATH, backend="torch",
+                 cache=prediction_cache.shared):
+        self.model_dir = model_dir
+        self.encoder_path = encoder_path
+        self.backend_name = backend
+        self.cache = cache
+        self.version = None
+        self.backend = None
+        self.tokenizer = None
+        self.training_report = None
+        self.model = None
+        self.encoder = None
+        self.classes_ = None
+
+    @classmethod
+    def train(cls, model_dir=MODEL_DIR, encoder_path=ENCODER_PATH, padding="dynamic", epochs=3):
+        instance = cls(model_dir, encoder_path)
+        instance.tokenizer = DistilBertTokenizer.from_pretrained(BASE_MODEL)
+        instance.model = DistilBertForSequenceClassification.from_pretrained(BASE_MODEL, num_labels=6)  # Adjust num_labels based on your labels
+        instance.encoder = LabelEncoder()
+        instance.train_model(padding=padding, epochs=epochs)
+        instance.backend = TorchBackend(model_dir, model=instance.model)
+        instance.classes_ = np.asarray(instance.encoder.classes_)
+        instance.version = instance.artifact_version()
+        return instance
+
+    @property
+    def loaded(self):
+        return self.backend is not None
+
+    def artifact_problems(self, check_data=False):
+        # Returns a list of human readable reasons the saved artifacts cannot
+        # be served; an empty list means they are usable.
+        problems = []
+        if not os.path.isdir(self.model_dir):
+            problems.append(f"model directory '{self.model_dir}' is missing (run: python model.py train)")
+        if not os.path.exists(self.encoder_path):
+            problems.append(f"label encoder '{self.encoder_path}' is missing (run: python model.py train)")
+        if problems:
+            return problems
+
+        manifest_file = os.path.join(self.model_dir, MANIFEST_NAME)
+        if not os.path.exists(manifest_file):
+            problems.append(f"'{manifest_file}' is missing; the artifacts were not written by 'python model.py train'")
+            return problems
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+
+        if manifest.get("encoder_digest") != file_digest(self.encoder_path):
+            problems.append(f"'{self.encoder_path}' does not belong to the model in '{self.model_dir}' (stale encoder)")
+        if check_data and os.path.exists(manifest.get("train_path", TRAIN_PATH)):
+            if manifest.get("train_digest") != file_digest(manifest.get("train_path", TRAIN_PATH)):
+                problems.append("training data has changed since the model was trained (stale model)")
+        return problems
+
+    def load(self):
+        if self.loaded:
+            return self
+        problems = self.artifact_problems()
+        if problems:
+            raise ModelArtifactError("Cannot load SerenityModel: " + "; ".join(problems))
+        self.tokenizer = DistilBertTokenizer.from_pretrained(self.model_dir)
+        self.backend = create_backend(self.backend_name, self.model_dir)
+        self.model = self.backend.model
+        self.encoder = joblib.load(self.encoder_path)
+        self.classes_ = np.asarray(self.encoder.classes_)
+        self.version = self.artifact_version()
+        return self
+
+    def artifact_version(self):
+        # Cheap identity of the saved artifacts (file names, sizes and mtimes
+        # plus the backend); retraining or re-exporting changes it.
+        parts = [self.backend_name]
+        paths = [os.path.join(self.model_dir, name) for name in sorted(os.listdir(self.model_dir))]
+        for path in paths + [self.encoder_path]:
+            stat = os.stat(path)
+            parts.append(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}")
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def train_model(self, padding="dynamic", epochs=3):
+        # padding="dynamic" pads each batch to its own longest message and
+        # groups similar lengths; "static" is the original pad-to-longest-in-
+        # the-dataset setup, kept for throughput comparisons.
+        if padding == "dynamic":
+            # Token ids come zero-copy from the memory-mapped dataset cache
+            classes = dataset_cache.train_classes(TRAIN_PATH)
+            self.encoder.fit(classes)
+            train_split = dataset_cache.prepare(TRAIN_PATH, classes, self.tokenizer, max_length=MAX_LENGTH)
+            test_split = dataset_cache.prepare(TEST_PATH, classes, self.tokenizer, max_length=MAX_LENGTH)
+            train_dataset = PackedEmotionDataset.from_split(train_split)
+            test_dataset = PackedEmotionDataset.from_split(test_split)
+            collator = CountingCollator(DynamicPaddingCollator(self.tokenizer.pad_token_id))
+        else:
+            train = pd.read_csv(TRAIN_PATH, delimiter=';')
+            test = pd.read_csv(TEST_PATH, delimiter=';')
+
+            # Encode labels
+            labels = self.encoder.fit_transform(train['label'])
+            test_labels = self.encoder.transform(test['label'])
+            train_texts = train['message'].tolist()
+            test_texts = test['message'].tolist()
+
+            train_encodings = self.tokenizer(train_texts, truncation=True, padding=True, max_length=MAX_LENGTH)
+            test_encodings = self.tokenizer(test_texts, truncation=True, padding=True, max_length=MAX_LENGTH)
+            train_dataset = EmotionDataset(train_encodings, labels)
+            test_dataset = EmotionDataset(test_encodings, test_labels)
+            collator = CountingCollator(default_data_collator)
+
         # Training arguments
         training_args = TrainingArguments(
             output_dir='./results',
-            num_train_epochs=3,
+            num_train_epochs=epochs,
             per_device_train_batch_size=8,
             per_device_eval_batch_size=8,
             warmup_steps=500,
             weight_decay=0.01,
             logging_dir='./logs',
-            evaluation_strategy="epoch"
+            evaluation_strategy="epoch",
+            group_by_length=(padding == "dynamic")
         )
-        
+
         # Trainer
-        trainer = Trainer(
+        throughput = ThroughputCallback(collator)
+        trainer = PackedTrainer(
             model=self.model,
             args=training_args,
             train_dataset=train_dataset,
-            eval_dataset=test_dataset
+            eval_dataset=test_dataset,
+            data_collator=collator,
+            callbacks=[throughput]
         )
         trainer.train()
-        
+        self.training_report = throughput.report(padding)
+
         # Save model
-        self.model.save_pretrained("serenity_model")
-        self.tokenizer.save_pretrained("serenity_model")
-        joblib.dump(self.encoder, "encoder.pkl")
+        self.model.save_pretrained(self.model_dir)
+        self.tokenizer.save_pretrained(self.model_dir)
+        joblib.dump(self.encoder, self.encoder_path)
+        self.write_manifest()
+
+    def write_manifest(self):
+        manifest = {
+            "base_model": BASE_MODEL,
+            "train_path": TRAIN_PATH,
+            "train_digest": file_digest(TRAIN_PATH),
+            "encoder_digest": file_digest(self.encoder_path),
+            "classes": [str(c) for c in self.encoder.classes_],
+            "training": self.training_report,
+        }
+        with open(os.path.join(self.model_dir, MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f, indent=2)
 
     def predict(self, message):
-        inputs = self.tokenizer(message, return_tensors="pt", truncation=True, padding=True, max_length=128)
-        outputs = self.model(**inputs)
+        self.load()
+        if self.cache is None:
+            return self._predict_one(message)
+        return self.cache.get_or_compute(message, self.version, lambda: self._predict_one(message),
+                                         namespace="distilbert")
+
+    def _predict_one(self, message):
+        labels, probs, _ = self.predict_batch([message])
+        return labels[0], probs[0]
+
+    def predict_batch(self, messages, batch_size=32):
+        # Score many messages at once. Inputs are sorted by token length so
+        # each batch is only padded to its own longest message; results are
+        # returned in the original input order as (labels, probabilities,
+        # full distribution with one column per encoder class).
+        self.load()
+        messages = list(messages)
+        with instrumentation.trace("distilbert", len(messages)) as trace:
+            with trace.stage("tokenize"):
+                input_ids = self.tokenizer(messages, truncation=True, max_length=MAX_LENGTH)["input_ids"]
+                order = sorted(range(len(messages)), key=lambda i: len(input_ids[i]))
+            trace.tokens(sum(len(ids) for ids in input_ids))
+
+            distribution = np.zeros((len(messages), len(self.classes_)), dtype=np.float32)
+            for start in range(0, len(order), batch_size):
+                bucket = order[start:start + batch_size]
+                with trace.stage("pad"):
+                    inputs = self.tokenizer.pad({"input_ids": [input_ids[i] for i in bucket]}, return_tensors="np")
+                with trace.stage("forward"):
+                    logits = self.backend.logits(inputs["input_ids"].astype(np.int64),
+                                                 inputs["attention_mask"].astype(np.int64))
+                with trace.stage("softmax"):
+                    distribution[bucket] = softmax(logits)
+
+            with trace.stage("decode"):
+                pred_idx = distribution.argmax(axis=1)
+                labels = self.classes_[pred_idx].tolist()
+                probs = distribution[np.arange(len(messages)), pred_idx].tolist()
+        return labels, probs, distribution
+
+
+def softmax(logits):
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def benchmark_batch(model, messages, batch_size=32):
+    # Compare the historical one-message-at-a-time loop against predict_batch.
+    model.load()
+    start = time.perf_counter()
+    for message in messages:
+        inputs = model.tokenizer(message, return_tensors="pt", truncation=True, padding=True, max_length=MAX_LENGTH)
+        outputs = model.model(**inputs)
         probs = outputs.logits.softmax(dim=1)
         pred_idx = probs.argmax().item()
-        prob = probs[0][pred_idx].item()
-        label = self.encoder.inverse_transform([pred_idx])[0]
-        return label, prob
+        model.encoder.inverse_transform([pred_idx])
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    model.predict_batch(messages, batch_size=batch_size)
+    batched = time.perf_counter() - start
+    return {
+        "messages": len(messages),
+        "single_per_sec": len(messages) / single,
+        "batched_per_sec": len(messages) / batched,
+        "speedup": single / batched,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or query the DistilBERT emotion classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="fine-tune DistilBERT on train.csv and save the artifacts")
+    train.add_argument("--padding", default="dynamic", choices=("dynamic", "static"),
+                       help="per-batch padding with length grouping, or the original pad-to-longest setup")
+    train.add_argument("--epochs", type=float, default=3)
+    sub.add_parser("status", help="check whether the saved artifacts are present and current")
+    predict = sub.add_parser("predict", help="classify a message with the saved model")
+    predict.add_argument("message", nargs="?", default="I feel really sad today")
+    bench = sub.add_parser("bench-batch", help="measure predict_batch throughput against the single-message loop")
+    bench.add_argument("--limit", type=int, default=500, help="number of test.csv messages to score")
+    bench.add_argument("--batch-size", type=int, default=32)
+    predict.add_argument("--backend", default="torch", choices=BACKENDS)
+    # the single-message baseline loop calls the PyTorch module directly
+    bench.add_argument("--backend", default="torch", choices=("torch", "int8"))
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        SerenityModel.train(padding=args.padding, epochs=args.epochs)
+        print(f"Saved model to '{MODEL_DIR}' and encoder to '{ENCODER_PATH}'")
+    elif args.command == "status":
+        problems = SerenityModel().artifact_problems(check_data=True)
+        for problem in problems:
+            print("-", problem)
+        print("Artifacts OK" if not problems else "Artifacts need retraining")
+        return 1 if problems else 0
+    elif args.command == "predict":
+        model = SerenityModel(backend=args.backend)
+        try:
+            label, prob = model.predict(args.message)
+        except ModelArtifactError as e:
+            print(e)
+            return 1
+        print(f"Predicted: {label}, Probability: {prob:.2f}")
+    elif args.command == "bench-batch":
+        messages = dataset_cache.load_texts(TEST_PATH)[0][:args.limit]
+        result = benchmark_batch(SerenityModel(backend=args.backend, cache=None), messages, batch_size=args.batch_size)
+        print(f"{result['messages']} messages: single {result['single_per_sec']:.1f} msg/s, "
+              f"batched {result['batched_per_sec']:.1f} msg/s ({result['speedup']:.2f}x)")
+    return 0
+
 
 if __name__ == "__main__":
-    model = SerenityModel()
-    label, prob = model.predict("I feel really sad today")
-    print(f"Predicted: {label}, Probability: {prob:.2f}")
\ No newline at end of file
+    sys.exit(main())
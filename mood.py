@@ -0,0 +1,52 @@
+import random
+
+# Keyword rules behind the Qt chat window's mood scoring and replies. Kept
+# free of Qt so they can be benchmarked and reused headless.
+SAD_WORDS = ("sad", "depressed")
+HAPPY_WORDS = ("happy", "good")
+
+# Emotion labels the keyword rules stand for, for comparison with the
+# trained classifiers
+KEYWORD_LABELS = {"sad": "sadness", "happy": "joy"}
+
+
+def keyword_mood(message):
+    message = message.lower()
+    if any(word in message for word in SAD_WORDS):
+        return "sad"
+    elif any(word in message for word in HAPPY_WORDS):
+        return "happy"
+    return "default"
+
+
+def score_mood(message):
+    # Simple mood scoring for demo
+    score = 5  # Neutral
+    mood = keyword_mood(message)
+    if mood == "sad":
+        score = random.randint(1, 3)
+    elif mood == "happy":
+        score = random.randint(7, 10)
+    return score
+
+
+def select_response(responses, message):
+    return random.choice(responses[keyword_mood(message)])
+
+
+class KeywordClassifier:
+    # The keyword rules behind the predict/predict_batch interface; messages
+    # no rule matches get the label "neutral", which never matches the data.
+    loaded = True
+    classes_ = ["joy", "neutral", "sadness"]
+
+    def load(self):
+        return self
+
+    def predict(self, message):
+        return KEYWORD_LABELS.get(keyword_mood(message), "neutral"), 1.0
+
+    def predict_batch(self, messages, batch_size=None):
+        labels = [self.predict(message)[0] for message in messages]
+        distribution = [[1.0 if label == c else 0.0 for c in self.classes_] for label in labels]
+        return labels, [1.0] * len(labels), distribution
@@ -0,0 +1,77 @@
+# PHQ-9 questionnaire and scoring shared by the Qt quiz, the console flow
+# and the HTTP service.
+QUESTIONS = [
+    "Little interest or pleasure in doing things?",
+    "Feeling down, depressed, or hopeless?",
+    "Trouble falling or staying asleep, or sleeping too much?",
+    "Feeling tired or having little energy?",
+    "Poor appetite or overeating?",
+    "Feeling bad about yourself or that you're a failure?",
+    "Trouble concentrating on things?",
+    "Moving or speaking slowly, or being fidgety?",
+    "Thoughts that you would be better off dead?"
+]
+
+OPTIONS = {
+    "Not at all": 0,
+    "Several days": 1,
+    "More than half the days": 2,
+    "Nearly every day": 3
+}
+
+# Letter answers used by the console quiz
+LETTERS = {"a": 0, "b": 1, "c": 2, "d": 3}
+
+MAX_SCORE = 3 * len(QUESTIONS)
+
+
+def answer_value(answer):
+    # Accepts 0-3, a letter A-D or the option text
+    if isinstance(answer, bool):
+        raise ValueError(f"Invalid answer: {answer!r}")
+    if isinstance(answer, int):
+        if 0 <= answer <= 3:
+            return answer
+        raise ValueError(f"Invalid answer: {answer!r}")
+    text = str(answer).strip()
+    if text.lower() in LETTERS:
+        return LETTERS[text.lower()]
+    for option, value in OPTIONS.items():
+        if text.lower() == option.lower():
+            return value
+    raise ValueError(f"Invalid answer: {answer!r}")
+
+
+def severity(total_score):
+    if total_score <= 4:
+        result = "minimal depression"
+        advice = "Your mood seems generally positive."
+    elif total_score <= 9:
+        result = "mild depression"
+        advice = "You might be experiencing some low mood."
+    elif total_score <= 14:
+        result = "moderate depression"
+        advice = "Consider speaking with a professional."
+    elif total_score <= 19:
+        result = "moderately severe depression"
+        advice = "Professional support could be helpful."
+    else:
+        result = "severe depression"
+        advice = "Please consider reaching out to a professional."
+    return result, advice
+
+
+def score_answers(answers):
+    if len(answers) != len(QUESTIONS):
+        raise ValueError(f"Expected {len(QUESTIONS)} answers, got {len(answers)}")
+    values = [answer_value(answer) for answer in answers]
+    total = sum(values)
+    result, advice = severity(total)
+    return {
+        "score": total,
+        "max_score": MAX_SCORE,
+        "severity": result,
+        "advice": advice,
+        # Item 9 asks about self-harm; any positive answer needs follow-up
+        "self_harm_flag": values[-1] > 0,
+    }
@@ -0,0 +1,145 @@
+import os
+import time
+import pickle
+import threading
+from collections import OrderedDict
+
+# Bounded LRU cache for predictions, keyed on normalized message text and the
+# version of the model that produced them. Each model has its own namespace;
+# seeing a new version for a namespace drops that namespace's old entries, so
+# a retrained artifact never serves stale answers.
+FORMAT_VERSION = 1
+
+
+def normalize(text):
+    return " ".join(str(text).lower().split())
+
+
+class PredictionCache:
+    def __init__(self, maxsize=4096, ttl=None, path=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _check_version(self, namespace, version):
+        if self.versions.get(namespace, version) != version:
+            stale = [key for key in self.entries if key[0] == namespace]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+        self.versions[namespace] = version
+
+    def get(self, text, version, namespace="default", default=None):
+        key = (namespace, version, normalize(text))
+        with self.lock:
+            self._check_version(namespace, version)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires = entry
+            if expires is not None and expires <= time.time():
+                del self.entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, text, version, value, namespace="default"):
+        key = (namespace, version, normalize(text))
+        expires = time.time() + self.ttl if self.ttl else None
+        with self.lock:
+            self._check_version(namespace, version)
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, text, version, compute, namespace="default"):
+        missing = object()
+        value = self.get(text, version, namespace, missing)
+        if value is missing:
+            value = compute()
+            self.put(text, version, value, namespace)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.versions.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+    def save(self, path=None):
+        path = path or self.path
+        with self.lock:
+            now = time.time()
+            entries = [(k, v) for k, v in self.entries.items() if v[1] is None or v[1] > now]
+            versions = dict(self.versions)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"format": FORMAT_VERSION, "versions": versions, "entries": entries}, f)
+        os.replace(tmp_path, path)
+
+    def load(self, path=None):
+        path = path or self.path
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return
+        if data.get("format") != FORMAT_VERSION:
+            return
+        now = time.time()
+        with self.lock:
+            self.versions.update(data["versions"])
+            for key, (value, expires) in data["entries"]:
+                if expires is None or expires > now:
+                    self.entries[key] = (value, expires)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+# Process-wide cache shared by the TF-IDF and DistilBERT predictors; entries
+# never collide because the model version is part of the key.
+shared = PredictionCache(maxsize=4096, ttl=24 * 3600)
+
+
+def persist_shared(path):
+    # Load the shared cache from path now and write it back at exit
+    import atexit
+
+    shared.path = path
+    if os.path.exists(path):
+        shared.load(path)
+    atexit.register(shared.save, path)
+    return shared
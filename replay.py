@@ -0,0 +1,170 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import OrderedDict
+from batching import MicroBatcher, percentiles
+from conversation import ConversationDriver, ConversationEngine, Session
+from intent_engine import IntentMatcher, load_intents
+
+# Replays recorded conversations through the conversation engine with no
+# pacing. A transcript file is JSONL with one user turn per line:
+#   {"session": "t1", "user": "I feel sad", "decision": "negative", "state": "offer_quiz"}
+# Turns are grouped by session in file order. "decision" and "state" are the
+# expected branch and resulting state; "says" is an optional substring of
+# the bot's reply. Any of them can be left out.
+EXPECTED = ("decision", "state", "says")
+
+
+def load_transcripts(path):
+    sessions = OrderedDict()
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            turn = json.loads(line)
+            if "user" not in turn:
+                raise ValueError(f"{path}:{number}: turn has no 'user' message")
+            sessions.setdefault(str(turn.get("session", "default")), []).append(turn)
+    return sessions
+
+
+def create_engine(classifier):
+    from benchmark import create
+
+    intents, responses = load_intents()
+    return ConversationEngine(create(classifier).load(), IntentMatcher(intents), responses)
+
+
+def observe(engine, turns):
+    # Feed one transcript through a fresh session; returns what the engine
+    # did for each turn
+    session = Session()
+    engine.start(session)
+    observed = []
+    for turn in turns:
+        result = engine.step(session, turn["user"])
+        observed.append({"decision": result.decision, "state": session.state_name, "lines": result.lines})
+        if result.finished:
+            break
+    return observed
+
+
+def check(engine, sessions):
+    failures = []
+    for name, turns in sessions.items():
+        observed = observe(engine, turns)
+        for number, turn in enumerate(turns):
+            if number >= len(observed):
+                failures.append((name, number, "turn", "sent", "session already finished"))
+                continue
+            got = observed[number]
+            for key in EXPECTED:
+                if key not in turn:
+                    continue
+                if key == "says":
+                    reply = "\n".join(got["lines"])
+                    if turn["says"] not in reply:
+                        failures.append((name, number, key, turn["says"], reply))
+                elif got[key] != turn[key]:
+                    failures.append((name, number, key, turn[key], got[key]))
+    return failures
+
+
+def record(engine, sessions, path):
+    # Rewrite the transcript with the decisions and states the engine makes now
+    with open(path, "w", encoding="utf-8") as f:
+        for name, turns in sessions.items():
+            for turn, got in zip(turns, observe(engine, turns)):
+                entry = {"session": name, "user": turn["user"], "decision": got["decision"], "state": got["state"]}
+                if "says" in turn:
+                    entry["says"] = turn["says"]
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+async def replay_load(engine, transcripts, sessions, max_batch_size, max_wait_ms):
+    # Replays `sessions` conversations at once, cycling through transcripts;
+    # classifications of concurrent sessions are micro-batched
+    batcher = MicroBatcher(engine.classifier.predict_batch, max_batch_size, max_wait_ms,
+                           max_queue=max(1024, sessions))
+    driver = ConversationDriver(engine, batcher)
+    latencies = []
+
+    async def converse(turns):
+        session, _ = driver.open()
+        for turn in turns:
+            start = time.perf_counter()
+            result = await driver.send(session.id, turn["user"])
+            latencies.append((time.perf_counter() - start) * 1000)
+            if result.finished:
+                break
+        driver.close(session.id)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(converse(transcripts[i % len(transcripts)]) for i in range(sessions)))
+    seconds = time.perf_counter() - start
+    stats = batcher.snapshot()
+    batcher.close()
+    return {
+        "sessions": sessions,
+        "turns": len(latencies),
+        "seconds": seconds,
+        "sessions_per_s": sessions / seconds,
+        "turn_ms": percentiles(sorted(latencies)),
+        "mean_batch_size": stats["mean_batch_size"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay and load-test recorded conversations")
+    parser.add_argument("--classifier", default="tfidf", choices=("keyword", "tfidf", "distilbert"))
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("check", help="replay transcripts and compare the bot's decisions")
+    run.add_argument("paths", nargs="+")
+
+    rec = sub.add_parser("record", help="store the current decisions as the expected ones")
+    rec.add_argument("path")
+
+    load = sub.add_parser("load", help="replay transcripts concurrently and report throughput")
+    load.add_argument("paths", nargs="+")
+    load.add_argument("--sessions", type=int, default=1000)
+    load.add_argument("--max-batch-size", type=int, default=64)
+    load.add_argument("--max-wait-ms", type=float, default=5.0)
+    load.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    args = parser.parse_args(argv)
+    engine = create_engine(args.classifier)
+
+    if args.command == "record":
+        record(engine, load_transcripts(args.path), args.path)
+        return 0
+
+    if args.command == "check":
+        failed = 0
+        for path in args.paths:
+            sessions = load_transcripts(path)
+            failures = check(engine, sessions)
+            print(f"{path}: {len(sessions)} transcripts, {len(failures)} mismatches")
+            for name, number, key, expected, got in failures:
+                print(f"  {name} turn {number + 1}: {key} expected {expected!r}, got {got!r}")
+            failed += len(failures)
+        return 1 if failed else 0
+
+    transcripts = [turns for path in args.paths for turns in load_transcripts(path).values()]
+    report = asyncio.run(replay_load(engine, transcripts, args.sessions, args.max_batch_size, args.max_wait_ms))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        turn_ms = report["turn_ms"]
+        print(f"{report['sessions']} sessions, {report['turns']} turns in {report['seconds']:.2f}s "
+              f"({report['sessions_per_s']:.0f} sessions/s, mean batch {report['mean_batch_size']:.1f})")
+        print(f"per-turn latency: p50 {turn_ms['p50']:.3f} ms, p95 {turn_ms['p95']:.3f} ms, "
+              f"p99 {turn_ms['p99']:.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
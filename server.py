@@ -0,0 +1,324 @@
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import phq9
+import instrumentation
+from intent_engine import IntentMatcher
+from batching import MicroBatcher, DeadlineExceeded, QueueFull
+
+# Minimal asyncio HTTP/1.1 service in front of the classifiers, the intent
+# matcher and PHQ-9 scoring. Connections are kept alive between requests and
+# model work goes through a bounded queue; when it is full the server answers
+# 503 with Retry-After instead of piling up requests.
+MAX_BODY = 64 * 1024
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None, payload=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+        self.payload = payload or {"error": message}
+
+
+def create_classifier(name):
+    if name == "tfidf":
+        from artifacts import TfidfClassifier
+        return TfidfClassifier()
+    if name == "distilbert":
+        from model import SerenityModel
+        return SerenityModel()
+    if name == "cascade":
+        from cascade import CascadeClassifier
+        return CascadeClassifier()
+    raise ValueError(f"Unknown model '{name}'")
+
+
+class SerenityServer:
+    def __init__(self, models=("tfidf",), queue_size=64, workers=2, keepalive_timeout=15.0,
+                 max_batch_size=16, max_wait_ms=10.0):
+        self.classifiers = {name: create_classifier(name) for name in models}
+        # Single-message classify requests are coalesced into batches
+        self.batchers = {
+            name: MicroBatcher(classifier.predict_batch, max_batch_size, max_wait_ms, max_queue=queue_size)
+            for name, classifier in self.classifiers.items()
+        }
+        self.matcher = IntentMatcher.from_file()
+        self.queue_size = queue_size
+        self.workers = workers
+        self.keepalive_timeout = keepalive_timeout
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.queue = None
+        self.worker_tasks = []
+        self.load_errors = {}
+        self.server = None
+
+    @property
+    def ready(self):
+        return all(classifier.loaded for classifier in self.classifiers.values())
+
+    async def start(self, host="127.0.0.1", port=8765):
+        loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.worker_tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+        # Load models in the background; /readyz reports when they are done
+        for name, classifier in self.classifiers.items():
+            loop.run_in_executor(self.executor, self.load_classifier, name, classifier)
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server
+
+    def load_classifier(self, name, classifier):
+        try:
+            classifier.load()
+        except Exception as e:
+            self.load_errors[name] = str(e)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self.worker_tasks:
+            task.cancel()
+        for batcher in self.batchers.values():
+            batcher.close()
+        self.executor.shutdown(wait=False)
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            func, args, future = await self.queue.get()
+            try:
+                result = await loop.run_in_executor(self.executor, func, *args)
+                if not future.done():
+                    future.set_result(result)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.queue.task_done()
+
+    async def submit(self, func, *args):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((func, args, future))
+        except asyncio.QueueFull:
+            raise HTTPError(503, "Server is busy, retry later", {"Retry-After": "1"})
+        return await future
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line:
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                if len(parts) != 3:
+                    await self.write_response(writer, 400, {"error": "Malformed request line"}, keep_alive=False)
+                    break
+                method, target, version = parts
+                connection = headers.get("connection", "").lower()
+                if version == "HTTP/1.1":
+                    keep_alive = connection != "close"
+                else:
+                    keep_alive = connection == "keep-alive"
+
+                length = headers.get("content-length", "0") or "0"
+                if not (length.isascii() and length.isdigit()):
+                    await self.write_response(writer, 400, {"error": "Invalid Content-Length"}, keep_alive=False)
+                    break
+                length = int(length)
+                if length > MAX_BODY:
+                    await self.write_response(writer, 413, {"error": "Request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload, extra = await self.dispatch(method, target.split("?", 1)[0], body)
+                await self.write_response(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def write_response(self, writer, status, payload, keep_alive, headers=None):
+        # Strings are sent as plain text (the Prometheus exposition format),
+        # everything else as JSON
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = json.dumps(payload).encode("utf-8")
+            content_type = "application/json"
+        lines = [
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {len(body)}",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, method, path, body):
+        routes = {
+            ("GET", "/healthz"): self.health,
+            ("GET", "/readyz"): self.readiness,
+            ("GET", "/stats"): self.batch_stats,
+            ("GET", "/metrics"): self.metrics,
+            ("POST", "/classify"): self.classify,
+            ("POST", "/intent"): self.intent,
+            ("POST", "/score"): self.score,
+        }
+        handler = routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in routes):
+                return 405, {"error": f"{method} not allowed on {path}"}, {}
+            return 404, {"error": f"No route for {path}"}, {}
+        try:
+            data = json.loads(body) if body else {}
+            if not isinstance(data, dict):
+                raise HTTPError(400, "Request body must be a JSON object")
+            return 200, await handler(data), {}
+        except json.JSONDecodeError:
+            return 400, {"error": "Request body is not valid JSON"}, {}
+        except HTTPError as e:
+            return e.status, e.payload, e.headers
+        except Exception as e:
+            return 500, {"error": str(e)}, {}
+
+    async def health(self, data):
+        return {"status": "ok"}
+
+    async def readiness(self, data):
+        status = {
+            "ready": self.ready,
+            "models": {name: classifier.loaded for name, classifier in self.classifiers.items()},
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue_size,
+        }
+        if self.load_errors:
+            status["errors"] = self.load_errors
+        if not self.ready:
+            raise HTTPError(503, "Models are still loading", payload=status)
+        return status
+
+    async def classify(self, data):
+        name = data.get("model", next(iter(self.classifiers), None))
+        if name not in self.classifiers:
+            raise HTTPError(400, f"Model '{name}' is not served; available: {', '.join(self.classifiers)}")
+        classifier = self.classifiers[name]
+        # A failed load never finishes; retrying would not help
+        if name in self.load_errors:
+            raise HTTPError(500, f"Model '{name}' failed to load: {self.load_errors[name]}")
+        if not classifier.loaded:
+            raise HTTPError(503, f"Model '{name}' is still loading", {"Retry-After": "1"})
+        if "message" in data and "messages" in data:
+            raise HTTPError(400, "Provide either 'message' or 'messages', not both")
+        messages = data.get("messages", [data.get("message")])
+        if not isinstance(messages, list) or not messages or not all(isinstance(m, str) and m for m in messages):
+            raise HTTPError(400, "Provide 'message' or a non-empty 'messages' list of strings")
+        timeout = data.get("timeout_ms")
+        if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                    or not timeout > 0):
+            raise HTTPError(400, "'timeout_ms' must be a positive number")
+
+        if "message" in data:
+            try:
+                label, prob, row = await self.batchers[name].predict_async(
+                    messages[0], timeout / 1000 if timeout else None)
+            except QueueFull:
+                raise HTTPError(503, "Server is busy, retry later", {"Retry-After": "1"})
+            except DeadlineExceeded:
+                raise HTTPError(503, "Deadline exceeded before the request could be scheduled")
+            labels, probs, distribution = [label], [prob], [row]
+        else:
+            labels, probs, distribution = await self.submit(classifier.predict_batch, messages)
+        classes = [str(c) for c in classifier.classes_]
+        results = [
+            {
+                "label": str(label),
+                "probability": float(prob),
+                "distribution": dict(zip(classes, map(float, row))),
+            }
+            for label, prob, row in zip(labels, probs, distribution)
+        ]
+        return {"model": name, "results": results}
+
+    async def batch_stats(self, data):
+        return {name: batcher.snapshot() for name, batcher in self.batchers.items()}
+
+    async def metrics(self, data):
+        if not instrumentation.enabled:
+            raise HTTPError(404, "Metrics are disabled (start with --metrics or SERENITY_METRICS=1)")
+        return instrumentation.dump()
+
+    async def intent(self, data):
+        message = data.get("message")
+        if not isinstance(message, str):
+            raise HTTPError(400, "Provide 'message' as a string")
+        matches = [
+            {"intent": name, "start": start, "end": end, "text": text}
+            for name, start, end, text in self.matcher.matches(message)
+        ]
+        return {"intent": self.matcher.intent(message), "matches": matches}
+
+    async def score(self, data):
+        answers = data.get("answers")
+        if not isinstance(answers, list):
+            raise HTTPError(400, f"Provide 'answers' as a list of {len(phq9.QUESTIONS)} values")
+        try:
+            return phq9.score_answers(answers)
+        except ValueError as e:
+            raise HTTPError(400, str(e))
+
+
+async def serve(host, port, models, queue_size, workers, max_batch_size, max_wait_ms):
+    app = SerenityServer(models, queue_size=queue_size, workers=workers,
+                         max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    server = await app.start(host, port)
+    print(f"Serving on http://{host}:{port} (models: {', '.join(models) or 'none'})")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local HTTP inference service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--models", nargs="*", default=["tfidf"], choices=("tfidf", "distilbert", "cascade"))
+    parser.add_argument("--queue-size", type=int, default=64, help="pending classify requests before 503")
+    parser.add_argument("--workers", type=int, default=2, help="inference threads")
+    parser.add_argument("--max-batch-size", type=int, default=16, help="largest micro-batch for single messages")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="longest a message waits for a batch to fill")
+    parser.add_argument("--metrics", action="store_true", help="record per-stage metrics and serve GET /metrics")
+    parser.add_argument("--metrics-log", help="also append one JSON line per classifier call to this file")
+    args = parser.parse_args(argv)
+    if args.metrics or args.metrics_log:
+        instrumentation.enable(log_path=args.metrics_log)
+    try:
+        asyncio.run(serve(args.host, args.port, args.models, args.queue_size, args.workers,
+                          args.max_batch_size, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
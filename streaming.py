@@ -0,0 +1,273 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import joblib
+import prediction_cache
+import instrumentation
+
+# Out-of-core training for labeled chat logs too large for memory. Rows are
+# read from the `message;label` CSVs in fixed-size chunks, hashed into a
+# fixed number of features (no vocabulary to hold) and fed to an
+# SGDClassifier through partial_fit, so memory does not grow with the corpus.
+# The checkpoint remembers how far each file was read; training again after
+# new rows are appended, or with new files, only reads what it has not seen.
+CHECKPOINT_VERSION = 1
+CHECKPOINT_PATH = os.path.join("artifacts", "streaming.joblib")
+CHUNK_SIZE = 10000
+# Bytes hashed at the start of each file to notice a replaced file. Only
+# the part already read is hashed, so appending rows never changes it.
+HEAD_BYTES = 1 << 16
+
+VECTORIZER_PARAMS = {
+    "n_features": 1 << 18,
+    "ngram_range": (1, 2),
+    "alternate_sign": False,
+    "norm": "l2",
+}
+CLASSIFIER_PARAMS = {"loss": "log_loss", "alpha": 1e-5, "class_weight": None}
+
+
+def head_digest(path, offset):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(min(HEAD_BYTES, offset))).hexdigest()
+
+
+def read_chunks(path, offset=0, chunk_size=CHUNK_SIZE):
+    # Yields (messages, labels, end offset) for rows after byte `offset`.
+    # The label is the last field, so messages may contain the delimiter.
+    with open(path, "rb") as f:
+        f.seek(offset)
+        if offset == 0:
+            f.readline()  # header
+        messages, labels = [], []
+        while True:
+            line = f.readline()
+            if not line:
+                break
+            if not line.endswith(b"\n"):
+                # A row still being appended; leave it for the next run
+                f.seek(-len(line), os.SEEK_CUR)
+                break
+            text = line.decode("utf-8").rstrip("\r\n")
+            if not text:
+                continue
+            message, _, label = text.rpartition(";")
+            messages.append(message)
+            labels.append(label)
+            if len(messages) == chunk_size:
+                yield messages, labels, f.tell()
+                messages, labels = [], []
+        if messages:
+            yield messages, labels, f.tell()
+
+
+def scan_classes(paths):
+    classes = set()
+    for path in paths:
+        for _, labels, _ in read_chunks(path):
+            classes.update(labels)
+    return sorted(classes)
+
+
+def new_checkpoint(classes, vectorizer_params=None, classifier_params=None):
+    from sklearn.linear_model import SGDClassifier
+
+    classifier_params = dict(classifier_params or CLASSIFIER_PARAMS)
+    return {
+        "version": CHECKPOINT_VERSION,
+        "vectorizer_params": dict(vectorizer_params or VECTORIZER_PARAMS),
+        "classifier_params": classifier_params,
+        "classes": list(classes),
+        "model": SGDClassifier(**classifier_params),
+        "sources": {},
+        "rows": 0,
+        "updated": None,
+    }
+
+
+def load_checkpoint(path=CHECKPOINT_PATH):
+    if not os.path.exists(path):
+        return None
+    checkpoint = joblib.load(path)
+    if checkpoint.get("version") != CHECKPOINT_VERSION:
+        return None
+    return checkpoint
+
+
+def save_checkpoint(checkpoint, path=CHECKPOINT_PATH):
+    checkpoint["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    joblib.dump(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def vectorizer_for(checkpoint):
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(**checkpoint["vectorizer_params"])
+
+
+def train(checkpoint, paths, chunk_size=CHUNK_SIZE, epochs=1, checkpoint_path=None, checkpoint_every=10):
+    # Feeds every unread row of `paths` to the model. With epochs > 1 the
+    # files are read again from where this call started. The checkpoint is
+    # saved every `checkpoint_every` chunks when a path is given.
+    import numpy as np
+
+    vectorizer = vectorizer_for(checkpoint)
+    model = checkpoint["model"]
+    index = {label: code for code, label in enumerate(checkpoint["classes"])}
+    codes = np.arange(len(index))
+    starts = {}
+    for path in paths:
+        source = checkpoint["sources"].get(path)
+        if (source is None or source["offset"] > os.path.getsize(path)
+                or source["head"] != head_digest(path, source["offset"])):
+            source = checkpoint["sources"][path] = {"offset": 0, "rows": 0, "head": head_digest(path, 0)}
+        starts[path] = source["offset"]
+
+    rows = chunks = skipped = 0
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        for path in paths:
+            source = checkpoint["sources"][path]
+            for messages, labels, end in read_chunks(path, starts[path], chunk_size):
+                keep = [i for i, label in enumerate(labels) if label in index]
+                skipped += len(labels) - len(keep)
+                if keep:
+                    X = vectorizer.transform([messages[i] for i in keep])
+                    y = np.fromiter((index[labels[i]] for i in keep), dtype=np.int64, count=len(keep))
+                    model.partial_fit(X, y, classes=codes)
+                # Later epochs re-read the same rows; the checkpoint counts
+                # each row once and its offset only moves forward
+                if epoch == 0:
+                    if source["offset"] < HEAD_BYTES:
+                        source["head"] = head_digest(path, end)
+                    source["offset"] = end
+                    source["rows"] += len(labels)
+                    checkpoint["rows"] += len(labels)
+                rows += len(labels)
+                chunks += 1
+                if checkpoint_path and chunks % checkpoint_every == 0:
+                    save_checkpoint(checkpoint, checkpoint_path)
+    if checkpoint_path:
+        save_checkpoint(checkpoint, checkpoint_path)
+    seconds = time.perf_counter() - start
+    return {
+        "rows": rows,
+        "skipped_rows": skipped,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "rows_per_s": rows / seconds if seconds else 0.0,
+        "peak_rss_mb": instrumentation.peak_rss_mb(),
+    }
+
+
+def evaluate(checkpoint, path, chunk_size=CHUNK_SIZE):
+    vectorizer = vectorizer_for(checkpoint)
+    classes = checkpoint["classes"]
+    correct = total = 0
+    for messages, labels, _ in read_chunks(path, 0, chunk_size):
+        pred = checkpoint["model"].predict(vectorizer.transform(messages))
+        correct += sum(classes[p] == label for p, label in zip(pred, labels))
+        total += len(labels)
+    return correct / total if total else 0.0
+
+
+class StreamingClassifier:
+    # Serves a streaming checkpoint with the same predict/predict_batch
+    # interface as artifacts.TfidfClassifier. Loaded on first use.
+    def __init__(self, path=CHECKPOINT_PATH, cache=prediction_cache.shared):
+        self.path = path
+        self.cache = cache
+        self.checkpoint = None
+
+    @property
+    def loaded(self):
+        return self.checkpoint is not None
+
+    @property
+    def version(self):
+        self.load()
+        return f"{self.checkpoint['updated']}/{self.checkpoint['rows']}"
+
+    def load(self):
+        import numpy as np
+
+        if self.checkpoint is None:
+            checkpoint = load_checkpoint(self.path)
+            if checkpoint is None:
+                raise FileNotFoundError(f"No streaming checkpoint at '{self.path}' (run: python streaming.py train)")
+            self.checkpoint = checkpoint
+            self.vectorizer = vectorizer_for(checkpoint)
+            self.classes_ = np.asarray(checkpoint["classes"])
+        return self
+
+    def predict(self, message):
+        self.load()
+        if self.cache is None:
+            return self._predict_one(message)
+        return self.cache.get_or_compute(message, self.version, lambda: self._predict_one(message),
+                                         namespace="streaming")
+
+    def _predict_one(self, message):
+        labels, probs, _ = self.predict_batch([message])
+        return labels[0], probs[0]
+
+    def predict_batch(self, messages, batch_size=None):
+        self.load()
+        distribution = self.checkpoint["model"].predict_proba(self.vectorizer.transform(list(messages)))
+        pred_idx = distribution.argmax(axis=1)
+        labels = self.classes_[pred_idx].tolist()
+        probs = distribution[range(len(pred_idx)), pred_idx].tolist()
+        return labels, probs, distribution
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Out-of-core training with hashed features and partial_fit")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fit = sub.add_parser("train", help="train on unread rows, resuming from the checkpoint if there is one")
+    fit.add_argument("paths", nargs="*", default=["train.csv"])
+    fit.add_argument("--fresh", action="store_true", help="ignore an existing checkpoint")
+    fit.add_argument("--classes", nargs="+", help="label set (default: scanned from the input files)")
+    fit.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    fit.add_argument("--epochs", type=int, default=1)
+    fit.add_argument("--n-features", type=int, default=VECTORIZER_PARAMS["n_features"])
+    fit.add_argument("--eval", default="test.csv", help="split to report accuracy on ('' to skip)")
+
+    sub.add_parser("status", help="show what the checkpoint has consumed")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        checkpoint = load_checkpoint(args.checkpoint)
+        if checkpoint is None:
+            print("No checkpoint at", args.checkpoint)
+            return 1
+        print(f"{checkpoint['rows']} rows, updated {checkpoint['updated']}, classes {checkpoint['classes']}")
+        for path, source in checkpoint["sources"].items():
+            print(f"  {path}: {source['rows']} rows, offset {source['offset']}")
+        return 0
+
+    checkpoint = None if args.fresh else load_checkpoint(args.checkpoint)
+    if checkpoint is None:
+        classes = args.classes or scan_classes(args.paths)
+        checkpoint = new_checkpoint(classes, dict(VECTORIZER_PARAMS, n_features=args.n_features))
+        print(f"New checkpoint with classes {classes}")
+    else:
+        print(f"Resuming from {args.checkpoint} ({checkpoint['rows']} rows seen)")
+
+    report = train(checkpoint, args.paths, args.chunk_size, args.epochs, args.checkpoint)
+    print(json.dumps(report, indent=2))
+    if args.eval and checkpoint["rows"]:
+        print(f"{args.eval} accuracy: {evaluate(checkpoint, args.eval, args.chunk_size):.4f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import artifacts
+
+# Hyperparameter sweep for the TF-IDF + LogisticRegression bundle, selected
+# on val.csv. Every vectorizer configuration is fitted once and its train and
+# val matrices are written as CSR buffers (data/indices/indptr .npy); the
+# classifier fits then run in a process pool and memory-map those buffers,
+# so workers share the page cache instead of each receiving a pickled copy.
+VAL_PATH = "val.csv"
+SWEEP_DIR = os.path.join(artifacts.ARTIFACT_DIR, "sweep")
+
+GRID = {
+    "vectorizer": {
+        "ngram_range": [[1, 1], [1, 2]],
+        "min_df": [1, 2],
+        "max_df": [0.9, 1.0],
+        "sublinear_tf": [False, True],
+    },
+    "classifier": {
+        "C": [0.1, 0.3, 1.0, 3.0, 10.0],
+    },
+}
+FIXED_CLASSIFIER = {"class_weight": "balanced", "max_iter": 1000}
+METRICS = ("macro_f1", "accuracy")
+
+
+def expand(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def config_key(options):
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def save_csr(matrix, prefix):
+    import numpy as np
+
+    np.save(prefix + "_data.npy", matrix.data)
+    np.save(prefix + "_indices.npy", matrix.indices)
+    np.save(prefix + "_indptr.npy", matrix.indptr)
+    with open(prefix + "_shape.json", "w") as f:
+        json.dump(list(matrix.shape), f)
+
+
+def load_csr(prefix):
+    import numpy as np
+    from scipy.sparse import csr_matrix
+
+    with open(prefix + "_shape.json") as f:
+        shape = tuple(json.load(f))
+    # Read-only memory maps; csr_matrix wraps them without copying
+    arrays = [np.load(prefix + f"_{part}.npy", mmap_mode="r") for part in ("data", "indices", "indptr")]
+    return csr_matrix(tuple(arrays), shape=shape, copy=False)
+
+
+def vectorize(options, train_dir, val_dir, sweep_dir):
+    # Fit one vectorizer configuration and store its matrices, unless a
+    # previous sweep over the same data already did. Runs in a worker; the
+    # prepared splits are opened from their cache directories.
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from dataset_cache import PreparedSplit
+
+    directory = os.path.join(sweep_dir, config_key(options))
+    done = os.path.join(directory, "vectorizer.json")
+    if os.path.exists(done):
+        return directory
+    os.makedirs(directory, exist_ok=True)
+    train, val = PreparedSplit(train_dir), PreparedSplit(val_dir)
+    vectorizer = TfidfVectorizer(**artifacts.vectorizer_params({"vectorizer": options}))
+    save_csr(vectorizer.fit_transform(train.messages()).tocsr(), os.path.join(directory, "train"))
+    save_csr(vectorizer.transform(val.messages()).tocsr(), os.path.join(directory, "val"))
+    with open(done, "w") as f:
+        json.dump({"options": options, "vocabulary_size": len(vectorizer.vocabulary_)}, f)
+    return directory
+
+
+def fit_one(directory, classifier_options, train_labels_path, val_labels_path):
+    # Runs in a worker process; everything it needs arrives as paths
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score, f1_score
+
+    X_train = load_csr(os.path.join(directory, "train"))
+    X_val = load_csr(os.path.join(directory, "val"))
+    y_train = np.load(train_labels_path, mmap_mode="r")
+    y_val = np.load(val_labels_path, mmap_mode="r")
+
+    start = time.perf_counter()
+    model = LogisticRegression(**classifier_options).fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    pred = model.predict(X_val)
+    return {
+        "accuracy": float(accuracy_score(y_val, pred)),
+        "macro_f1": float(f1_score(y_val, pred, average="macro")),
+        "fit_seconds": round(fit_seconds, 3),
+    }
+
+
+def run(grid, workers, train_path=artifacts.TRAIN_PATH, val_path=VAL_PATH, sweep_dir=SWEEP_DIR):
+    from dataset_cache import prepare, train_classes
+
+    classes = train_classes(train_path)
+    train = prepare(train_path, classes)
+    val = prepare(val_path, classes)
+    data_key = config_key({"train": artifacts.file_digest(train_path), "val": artifacts.file_digest(val_path)})
+    sweep_dir = os.path.join(sweep_dir, data_key)
+
+    train_labels = os.path.join(train.directory, "labels.npy")
+    val_labels = os.path.join(val.directory, "labels.npy")
+
+    start = time.perf_counter()
+    vectorize_seconds = 0.0
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Classifier fits for a configuration are queued as soon as its
+        # matrices are on disk
+        pending = {pool.submit(vectorize, options, train.directory, val.directory, sweep_dir): options
+                   for options in expand(grid["vectorizer"])}
+        fits = {}
+        for future in as_completed(pending):
+            options, directory = pending[future], future.result()
+            vectorize_seconds = time.perf_counter() - start
+            for classifier_options in expand(grid["classifier"]):
+                # The recorded kwargs are exactly what was fitted, so
+                # artifacts.build_bundle rebuilds the model that was scored
+                classifier_options = dict(classifier_options, **FIXED_CLASSIFIER)
+                fit = pool.submit(fit_one, directory, classifier_options, train_labels, val_labels)
+                fits[fit] = {"vectorizer": options, "classifier": classifier_options}
+        for future in as_completed(fits):
+            results.append({"params": fits[future], **future.result()})
+    return {
+        "train_path": train_path,
+        "val_path": val_path,
+        # Time until the last vectorizer configuration was on disk
+        "vectorize_seconds": round(vectorize_seconds, 3),
+        "seconds": round(time.perf_counter() - start, 3),
+        "results": results,
+    }
+
+
+def select(report, metric):
+    other = [m for m in METRICS if m != metric][0]
+    return sorted(report["results"], key=lambda r: (r[metric], r[other]), reverse=True)
+
+
+def write_selected(best, report, metric, artifact_dir=artifacts.ARTIFACT_DIR):
+    selection = {
+        "params": best["params"],
+        "metric": metric,
+        "val": {m: best[m] for m in METRICS},
+        "train_digest": artifacts.file_digest(report["train_path"]),
+        "val_digest": artifacts.file_digest(report["val_path"]),
+        "candidates": len(report["results"]),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    os.makedirs(artifact_dir, exist_ok=True)
+    tmp_path = artifacts.selected_path(artifact_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(selection, f, indent=2)
+    os.replace(tmp_path, artifacts.selected_path(artifact_dir))
+    return selection
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep TF-IDF/LR hyperparameters and select on val.csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--metric", choices=METRICS, default="macro_f1")
+    parser.add_argument("--top", type=int, default=10, help="configurations to print")
+    parser.add_argument("--dry-run", action="store_true", help="report only, keep the current selection")
+    parser.add_argument("--json", help="also write every result to this path")
+    args = parser.parse_args(argv)
+
+    report = run(GRID, args.workers)
+    ranked = select(report, args.metric)
+    print(f"{len(ranked)} configurations in {report['seconds']:.1f}s "
+          f"(vectorizing {report['vectorize_seconds']:.1f}s, {args.workers} workers)")
+    print(f"{'macroF1':>8} {'acc':>7} {'fit s':>6}  params")
+    for result in ranked[:args.top]:
+        print(f"{result['macro_f1']:>8.4f} {result['accuracy']:>7.4f} {result['fit_seconds']:>6.2f}  "
+              f"{json.dumps(result['params'], sort_keys=True)}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(report, results=ranked), f, indent=2)
+    if args.dry_run:
+        return 0
+
+    write_selected(ranked[0], report, args.metric)
+    # Build the bundle the app will now load by default
+    bundle = artifacts.load_or_build()
+    print(f"Selected {json.dumps(ranked[0]['params'], sort_keys=True)} -> bundle {bundle['key'][:16]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
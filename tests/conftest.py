@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The modules live at the repository root, next to the CSVs they read
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("joblib")
+pytest.importorskip("numpy")
+import numpy as np
+
+import prediction_cache
+from cascade import CascadeClassifier
+
+
+class FixedClassifier:
+    classes_ = np.array(["joy", "sadness"])
+    version = "fast-version"
+
+    def __init__(self, probability):
+        self.probability = probability
+
+    def load(self):
+        return self
+
+    def predict_batch(self, messages, batch_size=32):
+        probs = [self.probability] * len(messages)
+        return ["joy"] * len(messages), probs, np.tile([self.probability, 1 - self.probability], (len(messages), 1))
+
+
+class MissingTransformer:
+    classes_ = FixedClassifier.classes_
+
+    def artifact_version(self):
+        raise FileNotFoundError("serenity_model")
+
+
+def test_confident_messages_do_not_need_the_transformer():
+    cascade = CascadeClassifier(FixedClassifier(0.9), MissingTransformer(), threshold=0.6,
+                                cache=prediction_cache.PredictionCache())
+    assert cascade.predict("what a lovely day") == ("joy", 0.9)
+    assert cascade.escalations == 0
+
+
+def test_escalation_reports_the_missing_transformer():
+    cascade = CascadeClassifier(FixedClassifier(0.4), MissingTransformer(), threshold=0.6, cache=None)
+    with pytest.raises(FileNotFoundError):
+        cascade.predict("not sure")
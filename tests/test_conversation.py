@@ -0,0 +1,24 @@
+import phq9
+from conversation import ConversationEngine, Session
+from intent_engine import IntentMatcher
+
+
+class FixedClassifier:
+    def __init__(self, label):
+        self.label = label
+
+    def predict(self, message):
+        return self.label, 0.9
+
+
+def test_only_feeling_and_small_talk_messages_are_moods():
+    engine = ConversationEngine(FixedClassifier("sadness"), IntentMatcher.from_file(), {},
+                                small_talk=lambda message: "ok")
+    session = Session()
+    engine.start(session)
+    script = [("Ann", False), ("i feel low", True), ("yes", False), ("okay", False)]
+    script += [("a", False)] * len(phq9.QUESTIONS)
+    script += [("i feel a bit better", True), ("thanks", True)]
+    for message, mood in script:
+        assert engine.expects_mood(session) is mood, message
+        engine.step(session, message)
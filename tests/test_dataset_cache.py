@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("pandas")
+import dataset_cache
+
+
+def write_csv(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("message;label\ni am happy;joy\ni am sad;sadness\n")
+
+
+def test_rebuild_replaces_an_incomplete_cache_directory(tmp_path):
+    csv_path = str(tmp_path / "small.csv")
+    write_csv(csv_path)
+    cache_dir = str(tmp_path / "cache")
+    classes = ["joy", "sadness"]
+    key = dataset_cache.cache_key(csv_path, classes, None)
+    directory = dataset_cache.split_dir(csv_path, key, cache_dir)
+    # Left behind by an interrupted build: files but no meta.json
+    os.makedirs(directory)
+    with open(os.path.join(directory, "labels.npy"), "wb") as f:
+        f.write(b"partial")
+
+    split = dataset_cache.prepare(csv_path, classes, cache_dir=cache_dir)
+    assert split.messages() == ["i am happy", "i am sad"]
+    assert sorted(os.listdir(cache_dir)) == [os.path.basename(directory)]
+
+
+def test_publish_keeps_a_complete_directory_from_another_builder(tmp_path):
+    directory = tmp_path / "train-abc"
+    directory.mkdir()
+    (directory / "meta.json").write_text("{}")
+    tmp_dir = tmp_path / "train-abc.1.tmp"
+    tmp_dir.mkdir()
+    (tmp_dir / "meta.json").write_text("{}")
+
+    dataset_cache._publish(str(tmp_dir), str(directory))
+    assert not tmp_dir.exists()
+    assert (directory / "meta.json").exists()
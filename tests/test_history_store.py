@@ -0,0 +1,59 @@
+import time
+import threading
+from datetime import datetime
+
+from history_store import MoodStore, TranscriptStore
+
+
+def test_failed_write_does_not_block_flush(tmp_path):
+    store = MoodStore(str(tmp_path / "history.db"), flush_interval=0.01)
+    try:
+        store.add(datetime(2024, 1, 1), "fine", 1)
+        # NOT NULL constraint on message
+        store.add(datetime(2024, 1, 2), None, 0)
+        store.add(datetime(2024, 1, 3), "better", 2)
+
+        flushed = threading.Thread(target=store.flush, daemon=True)
+        flushed.start()
+        flushed.join(timeout=5)
+        assert not flushed.is_alive()
+        assert [entry["message"] for entry in store.range()] == ["fine", "better"]
+
+        store.add(datetime(2024, 1, 4), "still writing", 1)
+        store.flush()
+        assert store.count() == 3
+    finally:
+        store.close()
+
+
+def test_flush_commits_without_waiting_for_the_batch_window(tmp_path):
+    store = MoodStore(str(tmp_path / "history.db"), flush_interval=5)
+    try:
+        store.add(datetime(2024, 1, 1), "fine", 1)
+        start = time.perf_counter()
+        store.flush()
+        assert time.perf_counter() - start < 1
+        assert store.count() == 1
+    finally:
+        store.close()
+
+
+def test_reads_include_writes_still_queued(tmp_path):
+    moods = MoodStore(str(tmp_path / "history.db"), flush_interval=5)
+    transcript = TranscriptStore(str(tmp_path / "history.db"), flush_interval=5)
+    try:
+        moods.add(datetime(2024, 1, 1), "fine", 1)
+        moods.add(datetime(2024, 1, 2), "better", 2)
+        for seq in range(5):
+            transcript.add("s", seq, f"message {seq}", seq % 2 == 0)
+        assert moods.count() == 2
+        assert [score for _, score in moods.series()] == [1, 2]
+        assert [seq for seq, _, _ in transcript.page("s", 4, 3)] == [1, 2, 3]
+
+        moods.flush()
+        transcript.flush()
+        assert moods.count() == 2
+        assert [seq for seq, _, _ in transcript.page("s", 5, 10)] == [0, 1, 2, 3, 4]
+    finally:
+        moods.close()
+        transcript.close()
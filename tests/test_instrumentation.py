@@ -0,0 +1,7 @@
+import instrumentation
+
+
+def test_peak_rss_mb_is_plausible():
+    peak = instrumentation.peak_rss_mb()
+    # None only where neither resource nor psutil is available
+    assert peak is None or 1 < peak < 1 << 20
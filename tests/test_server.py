@@ -0,0 +1,71 @@
+import asyncio
+import json
+
+from server import SerenityServer
+
+
+class UnloadedClassifier:
+    loaded = False
+    classes_ = ["joy", "sadness"]
+
+    def load(self):
+        raise OSError("bundle is corrupt")
+
+
+def classify(app, payload):
+    return asyncio.run(app.dispatch("POST", "/classify", json.dumps(payload).encode("utf-8")))
+
+
+def make_server(classifier):
+    app = SerenityServer(models=())
+    app.classifiers["broken"] = classifier
+    return app
+
+
+def test_failed_load_is_reported_instead_of_still_loading():
+    app = make_server(UnloadedClassifier())
+    app.load_classifier("broken", app.classifiers["broken"])
+    status, payload, headers = classify(app, {"model": "broken", "message": "hello"})
+    assert status == 500
+    assert "bundle is corrupt" in payload["error"]
+    assert "Retry-After" not in headers
+
+
+def test_timeout_ms_must_be_a_positive_number():
+    classifier = UnloadedClassifier()
+    classifier.loaded = True
+    app = make_server(classifier)
+    for timeout in ("100", -5, 0, True, [1]):
+        status, payload, _ = classify(app, {"model": "broken", "message": "hello", "timeout_ms": timeout})
+        assert status == 400, timeout
+        assert "timeout_ms" in payload["error"]
+
+
+def test_messages_must_be_a_list_and_not_combined_with_message():
+    classifier = UnloadedClassifier()
+    classifier.loaded = True
+    app = make_server(classifier)
+    for payload in ({"messages": "hello"}, {"message": "hi", "messages": ["hello"]}):
+        status, _, _ = classify(app, dict(payload, model="broken"))
+        assert status == 400, payload
+
+
+def test_invalid_content_length_gets_a_400():
+    async def request(length):
+        app = SerenityServer(models=())
+        server = await app.start("127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"POST /intent HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+            await writer.drain()
+            response = await asyncio.wait_for(reader.read(), 5)
+            writer.close()
+            return response
+        finally:
+            await app.stop()
+
+    for length in ("abc", "-5", "²"):
+        response = asyncio.run(request(length))
+        assert response.startswith(b"HTTP/1.1 400 "), length
+        assert b"Connection: close" in response
@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("joblib")
+import streaming
+
+
+def write_rows(path, rows, mode="w"):
+    with open(path, mode, encoding="utf-8") as f:
+        if mode == "w":
+            f.write("message;label\n")
+        for message, label in rows:
+            f.write(f"{message};{label}\n")
+
+
+def test_appending_keeps_the_head_digest(tmp_path):
+    path = str(tmp_path / "log.csv")
+    write_rows(path, [("i am happy", "joy")])
+    offset = (tmp_path / "log.csv").stat().st_size
+    digest = streaming.head_digest(path, offset)
+    write_rows(path, [("i am sad", "sadness")], mode="a")
+    assert streaming.head_digest(path, offset) == digest
+
+
+def test_resume_reads_only_appended_rows_and_epochs_count_once(tmp_path):
+    pytest.importorskip("sklearn")
+    path = str(tmp_path / "log.csv")
+    write_rows(path, [("i am happy", "joy"), ("i am sad", "sadness")] * 5)
+    checkpoint = streaming.new_checkpoint(["joy", "sadness"])
+
+    report = streaming.train(checkpoint, [path], chunk_size=4, epochs=3)
+    assert report["rows"] == 30
+    assert checkpoint["rows"] == 10
+    assert checkpoint["sources"][path]["rows"] == 10
+
+    write_rows(path, [("so glad", "joy")], mode="a")
+    report = streaming.train(checkpoint, [path], chunk_size=4)
+    assert report["rows"] == 1
+    assert checkpoint["rows"] == checkpoint["sources"][path]["rows"] == 11
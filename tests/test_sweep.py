@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip("joblib")
+import artifacts
+import sweep
+
+
+def test_selected_params_are_the_fitted_kwargs(tmp_path):
+    options = sweep.expand(sweep.GRID["classifier"])[0]
+    fitted = dict(options, **sweep.FIXED_CLASSIFIER)
+    best = {
+        "params": {"vectorizer": {"max_df": 0.9}, "classifier": fitted},
+        "macro_f1": 0.5,
+        "accuracy": 0.5,
+    }
+    report = {"train_path": "train.csv", "val_path": "val.csv", "results": [best]}
+    sweep.write_selected(best, report, "macro_f1", artifact_dir=str(tmp_path))
+
+    params = artifacts.resolve_params(artifact_dir=str(tmp_path))
+    assert params == best["params"]
+    assert params["classifier"]["max_iter"] == sweep.FIXED_CLASSIFIER["max_iter"]
+
+
+def test_rebuilt_bundle_matches_evaluated_params(tmp_path):
+    pytest.importorskip("sklearn")
+    fitted = dict(C=1.0, **sweep.FIXED_CLASSIFIER)
+    best = {"params": {"vectorizer": {"max_df": 0.9}, "classifier": fitted}, "macro_f1": 0.5, "accuracy": 0.5}
+    report = {"train_path": "train.csv", "val_path": "val.csv", "results": [best]}
+    sweep.write_selected(best, report, "macro_f1", artifact_dir=str(tmp_path))
+
+    bundle = artifacts.load_or_build(artifact_dir=str(tmp_path))
+    assert bundle["params"] == best["params"]
+    model_params = bundle["model"].get_params()
+    for name, value in fitted.items():
+        assert model_params[name] == value
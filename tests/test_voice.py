@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import voice
+
+
+class ToneSource:
+    # Alternating bursts of loud and silent frames after a quiet calibration
+    sample_rate = voice.SAMPLE_RATE
+
+    def __init__(self, utterances, frame_samples=480):
+        silence = np.zeros(frame_samples, dtype=np.int16).tobytes()
+        loud = np.full(frame_samples, 8000, dtype=np.int16).tobytes()
+        self.frames_list = [silence] * 20
+        for _ in range(utterances):
+            self.frames_list += [loud] * 20 + [silence] * 30
+        self.read = 0
+        self.exhausted = threading.Event()
+
+    def frames(self):
+        for frame in self.frames_list:
+            self.read += 1
+            yield frame
+        self.exhausted.set()
+
+
+class BlockingRecognizer:
+    # Holds the first recognition until the source has been read to the end
+    def __init__(self, source):
+        self.source = source
+        self.count = 0
+
+    def recognize(self, pcm, sample_rate):
+        self.count += 1
+        if self.count == 1:
+            assert self.source.exhausted.wait(5), "capture stopped reading during recognition"
+        return f"part {self.count}"
+
+
+def test_capture_keeps_reading_while_recognizing():
+    source = ToneSource(utterances=3)
+    capture = voice.VoiceCapture(source, BlockingRecognizer(source))
+    assert capture.run() == "part 1 part 2 part 3"
+    assert source.read == len(source.frames_list)
+
+
+def test_max_utterances_stops_capture():
+    source = ToneSource(utterances=3)
+    capture = voice.VoiceCapture(source, voice.ScriptedRecognizer(["one", "two", "three"]), max_utterances=1)
+    assert capture.run() == "one"
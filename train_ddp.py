@@ -0,0 +1,227 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import contextlib
+
+# Data-parallel fine-tuning of SerenityModel across local CPU processes.
+# Each worker runs a replica under DistributedDataParallel with the gloo
+# backend and its share of the cores as intra-op threads; gradients are
+# all-reduced once per optimizer step. Gradient accumulation keeps the
+# effective batch (samples per optimizer step, over all workers) fixed, so
+# changing the worker count does not change the optimization.
+EFFECTIVE_BATCH = 32
+PER_WORKER_BATCH = 8
+LEARNING_RATE = 5e-5
+WEIGHT_DECAY = 0.01
+# The single-process Trainer warms up for 500 steps of 8 samples
+WARMUP_SAMPLES = 4000
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def accumulation_steps(effective_batch, per_worker_batch, world_size):
+    per_step = per_worker_batch * world_size
+    if effective_batch % per_step:
+        raise ValueError(f"Effective batch {effective_batch} is not a multiple of "
+                         f"{world_size} workers x {per_worker_batch} samples")
+    return effective_batch // per_step
+
+
+def worker(rank, world_size, config, port, result_path):
+    # Threads are pinned before torch does any parallel work
+    import torch
+
+    torch.set_num_threads(config["threads"])
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass
+    import torch.distributed as dist
+    from torch.nn.parallel import DistributedDataParallel
+    from torch.utils.data import DataLoader, DistributedSampler
+    from transformers import DistilBertTokenizer, DistilBertForSequenceClassification, get_linear_schedule_with_warmup
+    import dataset_cache
+    from model import BASE_MODEL, MAX_LENGTH, TRAIN_PATH, PackedEmotionDataset, DynamicPaddingCollator
+
+    os.environ["MASTER_ADDR"] = "127.0.0.1"
+    os.environ["MASTER_PORT"] = str(port)
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    torch.manual_seed(config["seed"])
+
+    tokenizer = DistilBertTokenizer.from_pretrained(BASE_MODEL)
+    classes = dataset_cache.train_classes(TRAIN_PATH)
+    # Rank 0 builds the token cache; the others then open it read-only
+    if rank == 0:
+        dataset_cache.prepare(TRAIN_PATH, classes, tokenizer, max_length=MAX_LENGTH)
+    dist.barrier()
+    train_split = dataset_cache.prepare(TRAIN_PATH, classes, tokenizer, max_length=MAX_LENGTH)
+    dataset = PackedEmotionDataset.from_split(train_split)
+
+    sampler = DistributedSampler(dataset, num_replicas=world_size, rank=rank, shuffle=True, seed=config["seed"])
+    loader = DataLoader(dataset, batch_size=config["per_worker_batch"], sampler=sampler,
+                        collate_fn=DynamicPaddingCollator(tokenizer.pad_token_id))
+
+    model = DistilBertForSequenceClassification.from_pretrained(BASE_MODEL, num_labels=len(classes))
+    ddp = DistributedDataParallel(model)
+    accumulation = config["accumulation"]
+    steps_per_epoch = len(loader) // accumulation
+    total_steps = config["max_steps"] or int(steps_per_epoch * config["epochs"])
+    optimizer = torch.optim.AdamW(ddp.parameters(), lr=LEARNING_RATE, weight_decay=WEIGHT_DECAY)
+    scheduler = get_linear_schedule_with_warmup(optimizer, WARMUP_SAMPLES // config["effective_batch"],
+                                                total_steps)
+
+    ddp.train()
+    step = micro = samples = tokens = 0
+    start = time.perf_counter()
+    epoch = 0
+    while step < total_steps:
+        sampler.set_epoch(epoch)
+        for batch in loader:
+            micro += 1
+            last = micro % accumulation == 0
+            # Gradients are only all-reduced on the micro-batch that ends an
+            # optimizer step
+            context = ddp.no_sync() if not last else contextlib.nullcontext()
+            with context:
+                loss = ddp(**batch).loss / accumulation
+                loss.backward()
+            samples += len(batch["labels"])
+            tokens += int(batch["attention_mask"].sum())
+            if last:
+                optimizer.step()
+                scheduler.step()
+                optimizer.zero_grad()
+                step += 1
+                if rank == 0 and step % 50 == 0:
+                    print(f"step {step}/{total_steps} loss {loss.item() * accumulation:.4f}", flush=True)
+                if step >= total_steps:
+                    break
+        epoch += 1
+    seconds = time.perf_counter() - start
+
+    totals = torch.tensor([samples, tokens], dtype=torch.float64)
+    dist.all_reduce(totals)
+    if rank == 0:
+        result = {
+            "workers": world_size,
+            "threads_per_worker": config["threads"],
+            "per_worker_batch": config["per_worker_batch"],
+            "accumulation": accumulation,
+            "effective_batch": config["effective_batch"],
+            "steps": step,
+            "seconds": round(seconds, 3),
+            "samples_per_s": round(totals[0].item() / seconds, 2),
+            "tokens_per_s": round(totals[1].item() / seconds, 1),
+        }
+        if config["save"]:
+            save(model, tokenizer, classes, result)
+        with open(result_path, "w") as f:
+            json.dump(result, f)
+    dist.destroy_process_group()
+
+
+def save(model, tokenizer, classes, result):
+    import joblib
+    from sklearn.preprocessing import LabelEncoder
+    from model import SerenityModel, MODEL_DIR, ENCODER_PATH
+
+    instance = SerenityModel()
+    instance.encoder = LabelEncoder().fit(classes)
+    instance.training_report = {"padding": "dynamic", "distributed": result}
+    model.save_pretrained(MODEL_DIR)
+    tokenizer.save_pretrained(MODEL_DIR)
+    joblib.dump(instance.encoder, ENCODER_PATH)
+    instance.write_manifest()
+
+
+def launch(workers, effective_batch=EFFECTIVE_BATCH, per_worker_batch=PER_WORKER_BATCH, epochs=3,
+           max_steps=None, threads=None, save_model=True, seed=42):
+    import torch.multiprocessing as mp
+
+    config = {
+        "effective_batch": effective_batch,
+        "per_worker_batch": per_worker_batch,
+        "accumulation": accumulation_steps(effective_batch, per_worker_batch, workers),
+        "threads": threads or max(1, (os.cpu_count() or 1) // workers),
+        "epochs": epochs,
+        "max_steps": max_steps,
+        "save": save_model,
+        "seed": seed,
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        result_path = os.path.join(tmp, "result.json")
+        mp.spawn(worker, args=(workers, config, free_port(), result_path), nprocs=workers, join=True)
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def scaling(worker_counts, steps, effective_batch=EFFECTIVE_BATCH, per_worker_batch=PER_WORKER_BATCH):
+    # Same number of optimizer steps at every worker count. Each worker gets
+    # the thread share it would have at the largest count, so efficiency
+    # compares like with like: throughput(n) / (n * throughput(1)).
+    threads = max(1, (os.cpu_count() or 1) // max(worker_counts))
+    rows = []
+    for workers in worker_counts:
+        result = launch(workers, effective_batch, per_worker_batch, max_steps=steps, threads=threads,
+                        save_model=False)
+        rows.append(result)
+    base = rows[0]["samples_per_s"] / rows[0]["workers"]
+    for row in rows:
+        row["speedup"] = round(row["samples_per_s"] / rows[0]["samples_per_s"], 3)
+        row["efficiency"] = round(row["samples_per_s"] / (row["workers"] * base), 3)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed data-parallel CPU training for SerenityModel")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fit = sub.add_parser("train", help="fine-tune across local worker processes and save the artifacts")
+    fit.add_argument("--workers", type=int, default=4)
+    fit.add_argument("--epochs", type=float, default=3)
+    fit.add_argument("--effective-batch", type=int, default=EFFECTIVE_BATCH)
+    fit.add_argument("--per-worker-batch", type=int, default=PER_WORKER_BATCH)
+    fit.add_argument("--threads", type=int, help="intra-op threads per worker (default: cores / workers)")
+
+    scale = sub.add_parser("scale", help="measure scaling efficiency from 1 to N workers")
+    scale.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    scale.add_argument("--steps", type=int, default=30, help="optimizer steps per run")
+    scale.add_argument("--effective-batch", type=int, default=EFFECTIVE_BATCH)
+    scale.add_argument("--per-worker-batch", type=int, default=PER_WORKER_BATCH)
+    scale.add_argument("--json", help="also write the table to this path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        result = launch(args.workers, args.effective_batch, args.per_worker_batch, args.epochs,
+                        threads=args.threads)
+        print(json.dumps(result, indent=2))
+        return 0
+
+    counts = sorted(set(args.workers))
+    if counts[0] != 1:
+        counts = [1] + counts
+    for workers in counts:
+        accumulation_steps(args.effective_batch, args.per_worker_batch, workers)
+    rows = scaling(counts, args.steps, args.effective_batch, args.per_worker_batch)
+    print(f"{'workers':>7} {'threads':>7} {'accum':>5} {'samples/s':>10} {'tokens/s':>10} {'speedup':>8} {'eff':>6}")
+    for row in rows:
+        print(f"{row['workers']:>7} {row['threads_per_worker']:>7} {row['accumulation']:>5} "
+              f"{row['samples_per_s']:>10.1f} {row['tokens_per_s']:>10.0f} {row['speedup']:>8.2f} "
+              f"{row['efficiency']:>6.1%}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+import uuid
+from collections import OrderedDict
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QAbstractItemView, QFrame
+from PyQt5.QtGui import QTextDocument, QColor, QPainter, QPainterPath
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QRectF, QPointF, QTimer
+from history_store import TranscriptStore
+
+# Model/view chat transcript. Only a bounded window of messages is kept in
+# memory; everything is written to a TranscriptStore and older messages are
+# paged back in when the view is scrolled to the top. The list view only lays
+# out and paints the bubbles that are visible.
+IsUserRole = Qt.UserRole + 1
+SeqRole = Qt.UserRole + 2
+
+
+class TranscriptModel(QAbstractListModel):
+    def __init__(self, store, window=500, page_size=50, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.window = window
+        self.page_size = page_size
+        self.session = uuid.uuid4().hex
+        self.rows = []  # (seq, html, is_user)
+        self.next_seq = 0
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        seq, html, is_user = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return html
+        if role == IsUserRole:
+            return is_user
+        if role == SeqRole:
+            return seq
+        return None
+
+    def append(self, html, is_user=False):
+        seq = self.next_seq
+        self.next_seq += 1
+        self.store.add(self.session, seq, html, is_user)
+        row = len(self.rows)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.rows.append((seq, html, is_user))
+        self.endInsertRows()
+        # Page the oldest messages out once the window is exceeded; they are
+        # already queued for the store
+        overflow = len(self.rows) - self.window
+        if overflow > 0:
+            self.beginRemoveRows(QModelIndex(), 0, overflow - 1)
+            del self.rows[:overflow]
+            self.endRemoveRows()
+
+    def has_older(self):
+        return bool(self.rows) and self.rows[0][0] > 0
+
+    def load_older(self):
+        # Page older messages back in at the top and drop the newest ones
+        # past the window; returns how many arrived
+        if not self.has_older():
+            return 0
+        page = self.store.page(self.session, self.rows[0][0], self.page_size)
+        if not page:
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(page) - 1)
+        self.rows[:0] = page
+        self.endInsertRows()
+        overflow = len(self.rows) - self.window
+        if overflow > 0:
+            first = len(self.rows) - overflow
+            self.beginRemoveRows(QModelIndex(), first, len(self.rows) - 1)
+            del self.rows[first:]
+            self.endRemoveRows()
+        return len(page)
+
+    def reload_latest(self):
+        # Jump back to the newest messages after browsing history
+        if self.rows and self.rows[-1][0] == self.next_seq - 1:
+            return
+        self.beginResetModel()
+        self.rows = self.store.page(self.session, self.next_seq, self.window)
+        self.endResetModel()
+
+
+class BubbleDelegate(QStyledItemDelegate):
+    PADDING_X = 15
+    PADDING_Y = 12
+    MARGIN = 8
+    MAX_WIDTH = 0.8
+    STYLES = {
+        True: (QColor("#2A527A"), "white"),
+        False: (QColor("#1E3A4D"), "#E0ECE4"),
+    }
+
+    def __init__(self, parent=None, cache_size=256):
+        super().__init__(parent)
+        # Laid-out documents for recently painted rows, keyed by (seq, width)
+        self.documents = OrderedDict()
+        self.cache_size = cache_size
+
+    def document(self, index, width):
+        key = (index.data(SeqRole), width)
+        doc = self.documents.get(key)
+        if doc is None:
+            background, color = self.STYLES[bool(index.data(IsUserRole))]
+            doc = QTextDocument()
+            doc.setDefaultStyleSheet(f"body {{ color: {color}; }}")
+            doc.setDocumentMargin(0)
+            doc.setHtml(f"<body>{index.data(Qt.DisplayRole)}</body>")
+            doc.setTextWidth(max(50, int(width * self.MAX_WIDTH) - 2 * self.PADDING_X))
+            doc.setTextWidth(min(doc.idealWidth(), doc.textWidth()))
+            self.documents[key] = doc
+            if len(self.documents) > self.cache_size:
+                self.documents.popitem(last=False)
+        else:
+            self.documents.move_to_end(key)
+        return doc
+
+    def row_width(self, option):
+        # sizeHint is asked before rows have a rect, so lay out against the
+        # viewport the delegate belongs to
+        view = self.parent()
+        return view.viewport().width() if view is not None else option.rect.width()
+
+    def sizeHint(self, option, index):
+        width = self.row_width(option)
+        doc = self.document(index, width)
+        return QSize(width, int(doc.size().height()) + 2 * self.PADDING_Y + self.MARGIN)
+
+    def paint(self, painter, option, index):
+        is_user = bool(index.data(IsUserRole))
+        doc = self.document(index, self.row_width(option))
+        background, _ = self.STYLES[is_user]
+        width = doc.textWidth() + 2 * self.PADDING_X
+        height = doc.size().height() + 2 * self.PADDING_Y
+        x = option.rect.right() - width - 20 if is_user else option.rect.left() + 20
+        bubble = QRectF(x, option.rect.top() + self.MARGIN / 2, width, height)
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        path = QPainterPath()
+        path.addRoundedRect(bubble, 10, 10)
+        painter.fillPath(path, background)
+        painter.translate(QPointF(bubble.left() + self.PADDING_X, bubble.top() + self.PADDING_Y))
+        doc.drawContents(painter)
+        painter.restore()
+
+
+class TranscriptView(QListView):
+    def __init__(self, store=None, window=500, page_size=50, parent=None):
+        super().__init__(parent)
+        self.transcript = TranscriptModel(store or TranscriptStore(), window, page_size, self)
+        self.setModel(self.transcript)
+        self.setItemDelegate(BubbleDelegate(self))
+        self.setFrameShape(QFrame.NoFrame)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOn)
+        self.setResizeMode(QListView.Adjust)
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(50)
+        self.setWordWrap(True)
+        self.verticalScrollBar().valueChanged.connect(self.on_scrolled)
+
+    def append(self, html, is_user=False):
+        self.transcript.reload_latest()
+        self.transcript.append(html, is_user)
+        QTimer.singleShot(0, self.scrollToBottom)
+
+    def on_scrolled(self, value):
+        if value != self.verticalScrollBar().minimum() or not self.transcript.has_older():
+            return
+        # Keep the message that was at the top in place while older ones
+        # are inserted above it
+        loaded = self.transcript.load_older()
+        if loaded:
+            self.scrollTo(self.transcript.index(loaded), QAbstractItemView.PositionAtTop)
+
+    def resizeEvent(self, event):
+        self.itemDelegate().documents.clear()
+        super().resizeEvent(event)
+
+    def close_store(self):
+        self.transcript.store.close()
@@ -0,0 +1,221 @@
+import wave
+import queue
+import threading
+import numpy as np
+
+# Chunked voice capture: an audio source yields fixed-size PCM frames, a
+# simple energy based voice-activity detector cuts them into utterances and
+# each utterance is handed to a pluggable recognizer on its own thread, so
+# frames keep being read while a chunk is being recognized.
+SAMPLE_RATE = 16000
+SAMPLE_WIDTH = 2  # 16-bit PCM
+FRAME_MS = 30
+
+
+class RecognitionError(Exception):
+    pass
+
+
+class MicrophoneSource:
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+        self.sample_rate = sample_rate
+        self.frame_samples = sample_rate * frame_ms // 1000
+
+    def frames(self):
+        import pyaudio
+
+        audio = pyaudio.PyAudio()
+        stream = audio.open(format=pyaudio.paInt16, channels=1, rate=self.sample_rate,
+                            input=True, frames_per_buffer=self.frame_samples)
+        try:
+            while True:
+                # Recognition runs off the capture thread, so the buffer is
+                # drained continuously and an overflow is not expected here
+                yield stream.read(self.frame_samples, exception_on_overflow=False)
+        finally:
+            stream.stop_stream()
+            stream.close()
+            audio.terminate()
+
+
+class WavFileSource:
+    # Replays a mono 16-bit WAV file as if it came from the microphone.
+    def __init__(self, path, frame_ms=FRAME_MS):
+        self.path = path
+        self.frame_ms = frame_ms
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != SAMPLE_WIDTH:
+                raise ValueError(f"'{path}' must be mono 16-bit PCM")
+            self.sample_rate = wav.getframerate()
+        self.frame_samples = self.sample_rate * frame_ms // 1000
+
+    def frames(self):
+        with wave.open(self.path, "rb") as wav:
+            while True:
+                frame = wav.readframes(self.frame_samples)
+                if not frame:
+                    return
+                yield frame
+
+
+class GoogleRecognizer:
+    name = "google"
+
+    def __init__(self, language="en-US"):
+        import speech_recognition as sr
+
+        self.sr = sr
+        self.recognizer = sr.Recognizer()
+        self.language = language
+
+    def recognize(self, pcm, sample_rate):
+        audio = self.sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+        try:
+            return self.recognizer.recognize_google(audio, language=self.language)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise RecognitionError(str(e))
+
+
+class SphinxRecognizer(GoogleRecognizer):
+    # Offline recognition through CMU PocketSphinx, no network round trip.
+    name = "sphinx"
+
+    def recognize(self, pcm, sample_rate):
+        audio = self.sr.AudioData(pcm, sample_rate, SAMPLE_WIDTH)
+        try:
+            return self.recognizer.recognize_sphinx(audio, language=self.language)
+        except self.sr.UnknownValueError:
+            return ""
+        except self.sr.RequestError as e:
+            raise RecognitionError(str(e))
+
+
+class ScriptedRecognizer:
+    # Test stand-in: returns the next scripted transcript for every chunk,
+    # typically paired with WavFileSource.
+    name = "scripted"
+
+    def __init__(self, transcripts):
+        self.transcripts = list(transcripts)
+
+    def recognize(self, pcm, sample_rate):
+        return self.transcripts.pop(0) if self.transcripts else ""
+
+
+RECOGNIZERS = {
+    "google": GoogleRecognizer,
+    "sphinx": SphinxRecognizer,
+}
+
+
+def frame_energy(frame):
+    samples = np.frombuffer(frame, dtype=np.int16).astype(np.float32)
+    if not len(samples):
+        return 0.0
+    return float(np.sqrt(np.mean(samples * samples)))
+
+
+class VoiceActivityDetector:
+    # Energy threshold calibrated from the first frames (ambient noise), with
+    # hangover so short pauses inside a sentence do not split the chunk.
+    def __init__(self, frame_ms=FRAME_MS, calibration_ms=300, silence_ms=600,
+                 max_chunk_ms=8000, min_speech_ms=150, ratio=2.5, floor=300.0):
+        self.calibration_frames = max(1, calibration_ms // frame_ms)
+        self.silence_frames = max(1, silence_ms // frame_ms)
+        self.max_chunk_frames = max(1, max_chunk_ms // frame_ms)
+        self.min_speech_frames = max(1, min_speech_ms // frame_ms)
+        self.ratio = ratio
+        self.floor = floor
+        self.noise = []
+        self.threshold = None
+
+    def chunks(self, frames, cancelled):
+        chunk = []
+        speech_frames = 0
+        silent_run = 0
+        for frame in frames:
+            if cancelled.is_set():
+                return
+            energy = frame_energy(frame)
+            if self.threshold is None:
+                self.noise.append(energy)
+                if len(self.noise) >= self.calibration_frames:
+                    self.threshold = max(self.floor, self.ratio * float(np.mean(self.noise)))
+                continue
+
+            if energy >= self.threshold:
+                chunk.append(frame)
+                speech_frames += 1
+                silent_run = 0
+            elif chunk:
+                chunk.append(frame)
+                silent_run += 1
+
+            if chunk and (silent_run >= self.silence_frames or len(chunk) >= self.max_chunk_frames):
+                if speech_frames >= self.min_speech_frames:
+                    yield b"".join(chunk)
+                chunk, speech_frames, silent_run = [], 0, 0
+        if chunk and speech_frames >= self.min_speech_frames and not cancelled.is_set():
+            yield b"".join(chunk)
+
+
+class VoiceCapture:
+    # Runs source -> VAD on the calling thread and hands finished chunks to a
+    # recognizer thread, which works through them in order and reports the
+    # running transcript. on_partial is invoked on the recognizer thread;
+    # cancel() stops the capture at the next frame boundary without waiting
+    # for a recognition in flight.
+    def __init__(self, source, recognizer, vad=None, max_utterances=None):
+        self.source = source
+        self.recognizer = recognizer
+        self.vad = vad or VoiceActivityDetector()
+        self.max_utterances = max_utterances
+        self.cancelled = threading.Event()
+        # Set by cancel(), a recognition error or reaching max_utterances
+        self.stopped = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.stopped.set()
+
+    def _recognize_loop(self, chunks, parts, errors, on_partial):
+        while True:
+            chunk = chunks.get()
+            if chunk is None or self.cancelled.is_set():
+                return
+            try:
+                text = self.recognizer.recognize(chunk, self.source.sample_rate)
+            except Exception as e:
+                errors.append(e)
+                self.stopped.set()
+                return
+            if self.cancelled.is_set():
+                return
+            if text:
+                parts.append(text)
+                if on_partial:
+                    on_partial(" ".join(parts))
+            if self.max_utterances and len(parts) >= self.max_utterances:
+                self.stopped.set()
+                return
+
+    def run(self, on_partial=None):
+        chunks = queue.Queue()
+        parts, errors = [], []
+        recognizer = threading.Thread(target=self._recognize_loop, args=(chunks, parts, errors, on_partial),
+                                      name="voice-recognizer", daemon=True)
+        recognizer.start()
+        try:
+            for chunk in self.vad.chunks(self.source.frames(), self.stopped):
+                chunks.put(chunk)
+        finally:
+            chunks.put(None)
+        if self.cancelled.is_set():
+            return " ".join(parts)
+        # Recognize what was still queued when the source ended
+        recognizer.join()
+        if errors:
+            raise errors[0]
+        return " ".join(parts)